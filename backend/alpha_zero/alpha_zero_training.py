@@ -3,15 +3,14 @@ from torch import optim
 from torch.utils.data import DataLoader
 import numpy as np
 import sys
-import os
 from mcts_iter import MCTS
 
 sys.path.append("./..")
 from shogi_game import ShogiGame
-from shogi_logic import rotate_board
-from variables import ACTION_SIZE
 
-from model import ResCNN
+from model import ResCNN, load_checkpoint, save_checkpoint
+from policy_targets import collate_examples, sparse_policy
+
 
 # can train from saved model if given input
 def policyIter(iters, episodes, sims, nn: ResCNN = ResCNN(2)):
@@ -30,11 +29,15 @@ def policyIter(iters, episodes, sims, nn: ResCNN = ResCNN(2)):
     return nnet
 
 
-def model_move(mcts: MCTS, num_iters, game: ShogiGame, action_choices):
-    for _ in range(num_iters):
-        mcts.search(game)
-    a = np.random.choice(action_choices, p=mcts.getPolicy(game))
-    return game.getNextState(a)
+def model_move(mcts: MCTS, num_iters, game: ShogiGame, opponent: MCTS):
+    # visits kept from the previous moves count towards num_iters
+    mcts.simulate(game, num_iters, reuse=True)
+    actions, probs = mcts.getSparsePolicy(game)
+    next_game = game.getNextState(np.random.choice(actions, p=probs))
+    # both trees continue from the position after the move
+    mcts.advance(next_game)
+    opponent.advance(next_game)
+    return next_game
 
 
 # assumes games always start from default position
@@ -49,20 +52,19 @@ def self_play(new_nnet: ResCNN, old_nnet: ResCNN):
     win_count = 0
     draws = 0
     max_move_count = 300
-    action_choices = np.arange(ACTION_SIZE)
 
     # games where new net goes first
     for _ in range(num_games):
         moves = 0
         # could do optimization with do while loop
         while moves < max_move_count and not game.getGameEnded():
-            game = model_move(new_mcts, mcts_iters, game, action_choices)
+            game = model_move(new_mcts, mcts_iters, game, old_mcts)
             moves += 1
             if game.getGameEnded():
                 win_count += 1
                 break
 
-            game = model_move(old_mcts, mcts_iters, game, action_choices)
+            game = model_move(old_mcts, mcts_iters, game, new_mcts)
             moves += 1
             print(moves)
         if not game.getGameEnded():
@@ -72,18 +74,18 @@ def self_play(new_nnet: ResCNN, old_nnet: ResCNN):
 
     # games where new net goes second
     for _ in range(num_games):
-        game = model_move(old_mcts, mcts_iters, game, action_choices)
+        game = model_move(old_mcts, mcts_iters, game, new_mcts)
 
         moves = 1
         while moves < max_move_count and not game.getGameEnded():
-            game = model_move(new_mcts, mcts_iters, game, action_choices)
+            game = model_move(new_mcts, mcts_iters, game, old_mcts)
             moves += 1
 
             if game.getGameEnded():
                 win_count += 1
                 break
 
-            game = model_move(old_mcts, mcts_iters, game, action_choices)
+            game = model_move(old_mcts, mcts_iters, game, new_mcts)
             moves += 1
         if not game.getGameEnded():
             draws += 1
@@ -92,29 +94,31 @@ def self_play(new_nnet: ResCNN, old_nnet: ResCNN):
     return win_count / (2 * num_games), draws
 
 
-def episode(nn: ResCNN, sims):
+def episode(nn: ResCNN, sims, mcts: MCTS = None, verbose=True, max_moves=500):
     examples = []
     game = ShogiGame()
-    mcts = MCTS(nn)
-    action_choices = np.arange(ACTION_SIZE)
-    max_moves = 500
+    mcts = mcts or MCTS(nn)
     move_count = 0
 
     # iterates until terminal node is reached
     while True:
-        for _ in range(sims):
-            mcts.search(game)
+        # visits kept from the previous move count towards sims
+        mcts.simulate(game, sims, reuse=True)
 
-        policy = mcts.getPolicy(game)
+        actions, probs = mcts.getSparsePolicy(game)
 
         # putting in board tensor rather than string for not
-        examples.append([game.toTensor(), policy, 0])  # placeholder reward
+        # placeholder reward
+        examples.append([game.toTensor(), sparse_policy(actions, probs), 0])
         # look into random.choices()
         # should we choose over distribution here or max?
-        a = np.random.choice(action_choices, p=policy)
+        a = np.random.choice(actions, p=probs)
         game = game.getNextState(a)
+        # the chosen child becomes the root, its siblings are freed
+        mcts.advance(game)
         move_count += 1
-        print(f"move made: {a}")
+        if verbose:
+            print(f"move made: {a}")
         if move_count > max_moves or game.getGameEnded():
             reward = 1
             for example in examples[::-1]:
@@ -137,13 +141,12 @@ def train(
         epoch_steps = 0
         for _ in range(batch_count):
             samples = np.random.randint(examples_len, size=batch_size)
-            boards, pis, vs = list(zip(*[examples[i] for i in samples]))
-            boards = torch.stack(boards)
+            boards, pis, vs = collate_examples([examples[i] for i in samples])
 
             boards, pis, vs = (
                 boards.to(device),
-                torch.FloatTensor(np.array(pis)).to(device),
-                torch.FloatTensor(np.array(vs).astype(np.float64)).to(device),
+                policy_to(pis, device),
+                vs.to(device),
             )
 
             out_pi, out_v = nn(boards)
@@ -181,7 +184,7 @@ def train_with_dataloader(
 
             boards, pis, vs = (
                 boards.to(device),
-                pis.to(device),
+                policy_to(pis, device),
                 vs.float().to(device),
             )
 
@@ -203,9 +206,20 @@ def train_with_dataloader(
     return losses
 
 
+# moves a dense policy tensor or collated (indices, weights) to device
+def policy_to(target, device: torch.device):
+    if isinstance(target, (tuple, list)):
+        return tuple(tensor.to(device) for tensor in target)
+    return target.to(device)
+
+
 # policy loss as defined in alpha zero paper
 # - (target policy) * (sample policy)
-def policy_loss(target: torch.Tensor, sample: torch.Tensor):
+# sparse targets only gather the sample at their actions
+def policy_loss(target, sample: torch.Tensor):
+    if isinstance(target, (tuple, list)):
+        indices, weights = target
+        return -torch.sum(weights * sample.gather(1, indices)) / weights.size()[0]
     return -torch.sum(target * sample) / target.size()[0]
 
 
@@ -215,34 +229,6 @@ def value_loss(target: torch.Tensor, sample: torch.Tensor):
     return torch.sum((target - sample.view(-1)) ** 2) / target.size()[0]
 
 
-def save_checkpoint(
-    nnet: ResCNN, optimizer: optim.Optimizer, filename="checkpoint.pth"
-):
-    if not os.path.exists("checkpoints"):
-        os.mkdir("checkpoints")
-    torch.save(
-        {
-            "model_state_dict": nnet.state_dict(),
-            "optimizer_state_dict": optimizer.state_dict(),
-        },
-        os.path.join("checkpoints", filename),
-    )
-
-
-def load_checkpoint(
-    nnet: ResCNN, path="checkpoints/checkpoint.pth", optimizer: optim.Optimizer = None
-):
-    # look into map location
-    checkpoint = torch.load(path, map_location=torch.device("cpu"))
-
-    if len(checkpoint["model_state_dict"]) != len(nnet.state_dict()):
-        raise ValueError("Invalid number of layers.")
-
-    nnet.load_state_dict(checkpoint["model_state_dict"])
-    if optimizer:
-        optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
-
-
 # trained_nn = ResCNN(19)
 # load_checkpoint(trained_nn)
 # base_nn = ResCNN(19)
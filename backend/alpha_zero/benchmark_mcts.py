@@ -0,0 +1,73 @@
+import argparse
+import sys
+from time import perf_counter
+import torch
+
+sys.path.append("./..")
+from shogi_game import ShogiGame
+from mcts_iter import MCTS
+from model import ResCNN
+
+"""
+Measures MCTS simulations per second from the starting position.
+
+Usage (from the alpha_zero folder):
+    python benchmark_mcts.py --sims 256 --layers 19 --batch-sizes 1 8 16 32
+    python benchmark_mcts.py --batch-sizes 1 --search-threads 1 2 4 --parallel root
+"""
+
+
+def benchmark(
+    nnet: ResCNN, sims: int, batch_size: int, threads=1, parallel="tree"
+) -> float:
+    """
+    Runs sims simulations with a fresh tree
+
+    Args:
+        nnet (ResCNN): network evaluating the leaves
+        sims (int): number of simulations
+        batch_size (int): leaves per forward pass (per thread), 1 for the
+            single leaf path
+        threads (int, optional): search threads
+        parallel (str, optional): "tree" or "root" parallel search
+
+    Returns:
+        float: simulations per second
+    """
+    game = ShogiGame()
+    with MCTS(nnet, batch_size=batch_size, threads=threads, parallel=parallel) as mcts:
+        start = perf_counter()
+        mcts.simulate(game, sims)
+        return sims / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCTS throughput benchmark")
+    parser.add_argument("--sims", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=19)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16, 32])
+    parser.add_argument("--threads", type=int, help="torch intra-op threads")
+    parser.add_argument("--search-threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--parallel", choices=["tree", "root"], default="tree")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    nnet = ResCNN(args.layers)
+    nnet.eval()
+    # warms up the network before timing
+    benchmark(nnet, 8, 1)
+
+    baseline = None
+    for threads in args.search_threads:
+        for batch_size in args.batch_sizes:
+            rate = benchmark(nnet, args.sims, batch_size, threads, args.parallel)
+            baseline = baseline or rate
+            print(
+                f"{threads} threads, batch size {batch_size} per thread: "
+                f"{rate:.1f} simulations/sec ({rate / baseline:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
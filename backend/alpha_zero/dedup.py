@@ -0,0 +1,180 @@
+import argparse
+import sys
+import numpy as np
+
+sys.path.append("./..")
+from shards import (
+    POLICY_ACTIONS,
+    SHARD_SIZE,
+    ShardWriter,
+    gather_records,
+    open_shards,
+)
+from variables import ACTION_SIZE
+
+"""
+Merges the examples of repeated positions, such as the opening moves that
+start most shogidb2 games. PositionIndex groups the examples of shards by
+a hash of their packed positions (history included), and each group
+becomes one example whose policy sums the move targets of the group like
+visit counts and whose value is the mean of the group's values.
+
+Merged targets are lossy: a record only holds POLICY_ACTIONS actions, so
+only the heaviest ones of a position are kept and renormalized. The
+positions truncated this way and the policy mass they lost are counted
+by PositionIndex and reported by dedup_shards.
+
+Usage (from the alpha_zero folder):
+    python dedup.py shogidb2/shards shogidb2/unique_shards
+"""
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def position_hashes(records: np.ndarray) -> np.ndarray:
+    """
+    Hashes the packed positions of records, vectorized over the records
+
+    Args:
+        records (np.ndarray): RECORD_DTYPE records
+
+    Returns:
+        np.ndarray: 64 bit FNV-1a hash of every record's positions
+    """
+    positions = np.ascontiguousarray(records["positions"])
+    data = positions.view(np.uint8).reshape(len(records), -1)
+    hashes = np.full(len(records), _FNV_OFFSET)
+    for column in data.T:
+        hashes ^= column
+        hashes *= _FNV_PRIME
+    return hashes
+
+
+class PositionIndex:
+    """
+    Groups the examples of shards by position hash. With 64 bit hashes,
+    collisions are negligible for any realistic number of positions.
+
+    Args:
+        shards (list): maps returned by open_shards
+        chunk_size (int, optional): records hashed at once
+    """
+
+    def __init__(self, shards: list, chunk_size=1 << 16):
+        self.shards = shards
+        self.offsets = np.cumsum([0] + [len(shard) for shard in shards])
+        hashes = [np.empty(0, dtype=np.uint64)]
+        for shard in shards:
+            for start in range(0, len(shard), chunk_size):
+                hashes.append(position_hashes(shard[start : start + chunk_size]))
+        hashes = np.concatenate(hashes)
+        # examples ordered by hash, so every position is a contiguous run
+        self.order = np.argsort(hashes, kind="stable")
+        hashes = hashes[self.order]
+        starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]])
+        self.bounds = np.r_[starts, len(hashes)]
+        # positions merged with more than POLICY_ACTIONS actions, and the
+        # sum of the fractions of their policies that were dropped
+        self.truncated = 0
+        self.dropped_mass = 0.0
+
+    def __len__(self):
+        # number of distinct positions
+        return len(self.bounds) - 1
+
+    @property
+    def examples(self) -> int:
+        return len(self.order)
+
+    def merged(self, first: int, last: int) -> np.ndarray:
+        """
+        Merges the examples of positions first to last (exclusive)
+
+        Args:
+            first (int): first position
+            last (int): position after the last one
+
+        Returns:
+            np.ndarray: one RECORD_DTYPE record per position
+        """
+        bounds = self.bounds[first : last + 1]
+        records = gather_records(
+            self.shards, self.offsets, self.order[bounds[0] : bounds[-1]]
+        )
+        counts = np.diff(bounds)
+        groups = np.repeat(np.arange(len(counts)), counts)
+        merged = records[bounds[:-1] - bounds[0]]
+        merged["value"] = np.bincount(groups, records["value"]) / counts
+
+        # total weight of every (position, action) pair
+        weights = records["weights"].reshape(-1)
+        played = weights > 0
+        keys = np.repeat(groups, POLICY_ACTIONS)[played] * ACTION_SIZE
+        keys += records["actions"].reshape(-1)[played]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights[played])
+
+        # keeps the POLICY_ACTIONS heaviest actions of every position
+        order = np.lexsort((-totals, keys // ACTION_SIZE))
+        keys, totals = keys[order], totals[order]
+        owners = keys // ACTION_SIZE
+        ranks = np.arange(len(keys)) - np.searchsorted(owners, owners)
+        kept = ranks < POLICY_ACTIONS
+        if not kept.all():
+            mass = np.bincount(owners, totals, minlength=len(counts))
+            lost = np.bincount(owners[~kept], totals[~kept], minlength=len(counts))
+            self.truncated += int(np.count_nonzero(lost))
+            self.dropped_mass += float(np.sum(lost / mass))
+        actions, policy = merged["actions"], merged["weights"]
+        actions[...] = 0
+        policy[...] = 0
+        actions[owners[kept], ranks[kept]] = keys[kept] % ACTION_SIZE
+        policy[owners[kept], ranks[kept]] = totals[kept]
+        policy /= policy.sum(axis=1, keepdims=True)
+        return merged
+
+
+def dedup_shards(source: str, directory: str, shard_size=SHARD_SIZE, chunk=1 << 16):
+    """
+    Writes the merged examples of the shards of source to directory
+
+    Args:
+        source (str): directory of the shards to merge
+        directory (str): directory to write the merged shards to
+        shard_size (int, optional): records per merged shard
+        chunk (int, optional): positions merged at once
+
+    Returns:
+        tuple: number of examples read, of positions written and of
+            truncated positions, and the mean fraction of the policy
+            dropped from the truncated positions
+    """
+    index = PositionIndex(open_shards(source))
+    with ShardWriter(directory, shard_size) as writer:
+        for first in range(0, len(index), chunk):
+            writer.write(index.merged(first, min(first + chunk, len(index))))
+    dropped = index.dropped_mass / max(index.truncated, 1)
+    return index.examples, len(index), index.truncated, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge repeated positions")
+    parser.add_argument("source", help="folder of the shards to merge")
+    parser.add_argument("directory", help="folder to write the merged shards to")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    examples, positions, truncated, dropped = dedup_shards(
+        args.source, args.directory, args.shard_size
+    )
+    print(f"merged {examples} examples into {positions} positions")
+    if truncated:
+        print(
+            f"{truncated} policies were cut to {POLICY_ACTIONS} actions, "
+            f"losing {dropped:.1%} of their mass on average"
+        )
+
+
+if __name__ == "__main__":
+    main()
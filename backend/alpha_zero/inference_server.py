@@ -0,0 +1,254 @@
+import sys
+import threading
+from concurrent.futures import Future
+from itertools import count
+from queue import Empty
+from time import monotonic
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+sys.path.append("./..")
+from model import ResCNN
+
+"""
+Network evaluation in a separate process. The process owns the model and
+coalesces the requests that arrive within max_latency seconds of each
+other (up to max_batch_size positions) into one forward pass, so many
+concurrent searches share the network instead of evaluating one position
+at a time.
+
+InferenceServer lives in the requesting process: evaluate can be called
+from any thread, and blocks until the results of its batch come back. If
+the inference process dies, the waiting and later requests fail with a
+RuntimeError instead of blocking forever.
+"""
+
+STOP = "STOP"
+# seconds between checks that the inference process is still alive
+POLL_INTERVAL = 0.5
+
+
+class InferenceStats:
+    """
+    Counters kept by the inference process
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.positions = 0
+        self.batches = 0
+        # requests waiting in the queue when a batch was closed
+        self.total_depth = 0
+        self.max_depth = 0
+        # seconds between submitting a request and its forward pass
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, batch: list, depth: int, start: float):
+        self.batches += 1
+        self.requests += len(batch)
+        self.positions += sum(len(planes) for _, planes, _ in batch)
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+        for _, _, submitted in batch:
+            self.total_wait += start - submitted
+            self.max_wait = max(self.max_wait, start - submitted)
+
+    def to_dict(self) -> dict:
+        batches = max(self.batches, 1)
+        return {
+            "requests": self.requests,
+            "positions": self.positions,
+            "batches": self.batches,
+            "mean_batch_size": self.positions / batches,
+            "mean_queue_depth": self.total_depth / batches,
+            "max_queue_depth": self.max_depth,
+            "mean_wait_ms": 1000 * self.total_wait / max(self.requests, 1),
+            "max_wait_ms": 1000 * self.max_wait,
+        }
+
+
+def _queue_depth(queue) -> int:
+    try:
+        return queue.qsize()
+    except NotImplementedError:
+        # not available on every platform
+        return 0
+
+
+def _inference_worker(
+    layers, state_dict, requests, responses, max_batch_size, max_latency
+):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    nnet = ResCNN(layers)
+    nnet.load_state_dict(state_dict)
+    nnet.to(device)
+    nnet.eval()
+    stats = InferenceStats()
+
+    # request that didn't fit in the previous batch
+    pending = None
+    while True:
+        request = pending or requests.get()
+        pending = None
+        if request == STOP:
+            break
+        request_id, planes, _ = request
+        if planes is None:
+            responses.put((request_id, stats.to_dict()))
+            continue
+
+        batch = [request]
+        size = len(planes)
+        deadline = monotonic() + max_latency
+        while size < max_batch_size:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = requests.get(timeout=timeout)
+            except Empty:
+                break
+            if request == STOP or request[1] is None:
+                pending = request
+                break
+            if size + len(request[1]) > max_batch_size:
+                pending = request
+                break
+            batch.append(request)
+            size += len(request[1])
+
+        start = monotonic()
+        stats.record(batch, len(batch) + _queue_depth(requests), start)
+        inputs = np.concatenate([planes for _, planes, _ in batch])
+        with torch.no_grad():
+            pis, vs = nnet(torch.from_numpy(inputs).to(device))
+        pis, vs = pis.cpu().numpy(), vs.cpu().numpy().reshape(-1)
+
+        offset = 0
+        for request_id, planes, _ in batch:
+            end = offset + len(planes)
+            responses.put((request_id, (pis[offset:end], vs[offset:end])))
+            offset = end
+
+
+class InferenceServer:
+    """
+    Starts the inference process and routes its results back to the
+    waiting callers
+
+    Args:
+        nnet (ResCNN): network to serve, copied into the process
+        max_batch_size (int, optional): most positions in a forward pass
+        max_latency (float, optional): seconds a batch waits for requests
+        timeout (float, optional): seconds a request waits for its result
+            before raising TimeoutError, unlimited if None
+    """
+
+    def __init__(
+        self, nnet: ResCNN, max_batch_size=64, max_latency=0.005, timeout=None
+    ):
+        ctx = mp.get_context("spawn")
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.timeout = timeout
+        self._requests = ctx.Queue()
+        self._responses = ctx.Queue()
+        state_dict = {k: v.cpu() for k, v in nnet.state_dict().items()}
+        self._process = ctx.Process(
+            target=_inference_worker,
+            args=(
+                nnet.layers,
+                state_dict,
+                self._requests,
+                self._responses,
+                max_batch_size,
+                max_latency,
+            ),
+            daemon=True,
+        )
+        self._futures = {}
+        # set once the inference process died, failing every request
+        self._error = None
+        self._lock = threading.Lock()
+        self._ids = count()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __call__(self, planes: np.ndarray):
+        return self.evaluate(planes)
+
+    def start(self):
+        self._process.start()
+        self._dispatcher.start()
+
+    def stop(self):
+        self._requests.put(STOP)
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._responses.put(STOP)
+        self._dispatcher.join(timeout=5)
+
+    def _submit(self, planes) -> Future:
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+        self._requests.put((request_id, planes, monotonic()))
+        return future
+
+    def _dispatch(self):
+        while True:
+            try:
+                response = self._responses.get(timeout=POLL_INTERVAL)
+            except Empty:
+                if not self._process.is_alive():
+                    self._fail(RuntimeError("The inference process died."))
+                    break
+                continue
+            if response == STOP:
+                break
+            request_id, result = response
+            with self._lock:
+                future = self._futures.pop(request_id)
+            future.set_result(result)
+
+    def _fail(self, error: Exception):
+        with self._lock:
+            self._error = error
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(error)
+
+    def evaluate(self, planes: np.ndarray) -> tuple:
+        """
+        Evaluates positions, batched with the other pending requests
+
+        Args:
+            planes (np.ndarray): (N, INPUT_PLANES, 9, 9) input planes
+
+        Returns:
+            tuple: (N, ACTION_SIZE) policies and (N,) values
+        """
+        # copied so the caller can reuse its buffer while the request waits
+        future = self._submit(np.array(planes, dtype=np.float32))
+        return future.result(self.timeout)
+
+    def stats(self) -> dict:
+        """
+        Gets the batching metrics of the inference process
+
+        Returns:
+            dict: request, batch size, queue depth and wait time metrics
+        """
+        return self._submit(None).result(self.timeout)
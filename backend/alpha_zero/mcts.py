@@ -3,6 +3,7 @@ import sys
 
 sys.path.append("./..")
 from shogi_game import ShogiGame
+from move_conversion import action_to_move
 import numpy as np
 from variables import *
 import torch.nn as nn
@@ -38,8 +39,8 @@ class MCTS:
 
     def search(self, current_game: ShogiGame):
 
-        # will be representing board states with string
-        s = current_game.toString()
+        # will be representing board states with their zobrist key
+        s = current_game.zobrist_key
 
         # gets status of previously unencountered game state
         if s not in self.Es:
@@ -81,7 +82,7 @@ class MCTS:
         # see if this is fast enough or if iteration
         # through len(valids) or ACTION_SIZE better
         valids = self.Vs[s]
-        valids = np.argwhere(valids)
+        valids = np.flatnonzero(valids)
         cur_best = -float("inf")
         best_act = -1
 
@@ -104,9 +105,12 @@ class MCTS:
                 cur_best = u
                 best_act = a
 
-        next_s = current_game.getNextState(best_act)
-
-        v = self.search(next_s)
+        # searches the child in place and restores the position afterwards
+        current_game.push(action_to_move(best_act))
+        try:
+            v = self.search(current_game)
+        finally:
+            current_game.pop()
 
         sa_tup = (s, best_act)
         # updates the value of the q function
@@ -126,8 +130,9 @@ class MCTS:
         # print("finished 3")
         return -v
 
-    # given the string representation, get visit count policy
-    def getPolicy(self, state: str):
+    # given the game state, get visit count policy
+    def getPolicy(self, game: ShogiGame):
+        state = game.zobrist_key
         action_dict = self.Nsa[state]
         policy = np.zeros(ACTION_SIZE)
         for action, count in action_dict.items():
@@ -1,131 +1,417 @@
 import math
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 sys.path.append("./..")
 from shogi_game import ShogiGame
+from move_conversion import action_to_move
+from transposition import TranspositionTable, Node
+from encoding import INPUT_PLANES
 import numpy as np
 from variables import *
 import torch.nn as nn
 import torch
 
+PARALLEL_MODES = ("tree", "root")
+# locks shared by the nodes of a tree in tree parallel mode
+NODE_LOCKS = 64
+_NO_LOCK = nullcontext()
+
 # Heavily inspired by https://github.com/suragnair/alpha-zero-general/blob/master/MCTS.py
 # with iterative search method
 class MCTS:
-    def __init__(self, nnet: nn.Module, q=[], n=[], c_puct=0.2):
+    def __init__(
+        self,
+        nnet: nn.Module,
+        q=[],
+        n=[],
+        c_puct=0.2,
+        max_memory_mb=512,
+        replacement="lru",
+        max_age=None,
+        batch_size=1,
+        virtual_loss=1.0,
+        evaluator=None,
+        threads=1,
+        parallel="tree",
+    ):
+        if parallel not in PARALLEL_MODES:
+            raise ValueError(f"Unknown parallel mode {parallel}.")
         self.nnet = nnet
+        # callable mapping a batch of input planes to (policies, values)
+        # arrays, such as an InferenceServer, used instead of nnet if given
+        self.evaluator = evaluator
         self.q = q
         self.n = n
         # controls level of exploration
         self.c_puct = c_puct
 
-        self.Qsa = {}  # Q table
-        # original implementation used tuples for Nsa
-        # will use dict of action values instead
-        self.Nsa = {}  # times s,a is visited
-        self.Ns = {}  # stores times s is visited
-        self.Ps = {}  # initial policy priors
+        # node statistics (priors, valid moves, visit counts, q values and
+        # whether the game ended) keyed by zobrist key
+        self.table = TranspositionTable(max_memory_mb, replacement, max_age)
+
+        # number of leaves evaluated together by search_batch
+        self.batch_size = batch_size
+        # value counted for every pending simulation through an edge, which
+        # spreads the simulations of a batch over different leaves
+        self.virtual_loss = virtual_loss
+        # input planes of the leaves of a batch, reused between batches
+        self._inputs = np.empty(
+            (batch_size, INPUT_PLANES, BOARD_SIZE, BOARD_SIZE), dtype=np.float32
+        )
+
+        # with more than one thread, "tree" searches one shared tree using
+        # virtual loss, while "root" searches independent trees (each with
+        # its own memory budget) and merges their root visit counts
+        self.threads = threads
+        self.parallel = parallel
+        tree_parallel = threads > 1 and parallel == "tree"
+        self._table_lock = threading.Lock() if tree_parallel else _NO_LOCK
+        self._node_locks = None
+        if tree_parallel:
+            self._node_locks = [threading.Lock() for _ in range(NODE_LOCKS)]
+        self._helpers = []
+        if threads > 1 and parallel == "root":
+            self._helpers = [
+                MCTS(
+                    nnet,
+                    c_puct=c_puct,
+                    max_memory_mb=max_memory_mb,
+                    replacement=replacement,
+                    max_age=max_age,
+                    batch_size=batch_size,
+                    virtual_loss=virtual_loss,
+                    evaluator=evaluator,
+                )
+                for _ in range(threads - 1)
+            ]
+        self._pool = ThreadPoolExecutor(threads) if threads > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
-        self.Es = {}  # stores if game ended
-        self.Vs = {}  # stores valid moves for s
+    def close(self):
+        """
+        Stops the search threads, after which the tree can still be read
+        but simulate is limited to a single thread
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.threads = 1
 
     def predict(self, game: ShogiGame):
+        # expands to include batch size of one
+        pis, vs = self.predict_batch(game.toTensor().expand(1, -1, -1, -1))
+        return pis[0], vs[0]
+
+    def predict_batch(self, input: torch.Tensor):
+        if self.evaluator is not None:
+            return self.evaluator(input.numpy())
         # try to understand cuda code for optimization
         self.nnet.eval()
-        # expands to include batch size of one
-        input = game.toTensor().expand(1, -1, -1, -1)
         with torch.no_grad():
             pi, v = self.nnet(input)
-        return pi.numpy()[0], v.numpy()[0]
+        return pi.numpy(), v.numpy().reshape(-1)
+
+    def simulate(self, game: ShogiGame, sims: int, reuse=False):
+        """
+        Runs sims simulations from game, in batches of batch_size leaves
+        when batching is enabled and split over the threads when searching
+        in parallel (every thread then evaluates its own batches)
+
+        Args:
+            game (ShogiGame): root position
+            sims (int): number of simulations
+            reuse (bool, optional): count the visits the root kept from
+                earlier searches (see advance) towards sims
+        """
+        if reuse:
+            sims -= sum(root.n for root in self._roots(game.zobrist_key, peek=True))
+        if sims <= 0:
+            return
+        if self.threads <= 1:
+            self._simulate(game, sims)
+            return
 
-    def search(self, current_game: ShogiGame):
+        counts = [
+            sims // self.threads + (i < sims % self.threads)
+            for i in range(self.threads)
+        ]
+        if self.parallel == "root":
+            jobs = [
+                self._pool.submit(searcher._simulate, game.copy(), count)
+                for searcher, count in zip([self] + self._helpers, counts)
+            ]
+        else:
+            jobs = [
+                self._pool.submit(self._search_shared, game.copy(), count)
+                for count in counts
+            ]
+        # every thread walks its own copy of the root, and the forward
+        # passes release the GIL
+        for job in jobs:
+            job.result()
+
+    def _simulate(self, game: ShogiGame, sims: int):
+        if self.batch_size <= 1:
+            for _ in range(sims):
+                self.search(game)
+            return
+        while sims > 0:
+            sims -= self.search_batch(game, min(sims, self.batch_size))
+
+    def _search_shared(self, game: ShogiGame, sims: int):
+        # virtual loss keeps the threads sharing the tree on different paths
+        if self.batch_size <= 1:
+            for _ in range(sims):
+                self.search(game, virtual=True)
+            return
+        # the planes of the batches of every thread are kept apart
+        inputs = np.empty_like(self._inputs)
+        while sims > 0:
+            sims -= self.search_batch(game, min(sims, self.batch_size), inputs)
+
+    def search(self, current_game: ShogiGame, virtual=False):
         stack = []
+        # the tree is walked in place and the game is restored afterwards
         game = current_game
-        leaf_value = 0
-        while True:
-            s = game.toString()
-            if s not in self.Es:
-                self.Es[s] = game.getGameEnded()
+        try:
+            leaf_value = self._select(game, stack, virtual)
+            if leaf_value is None:
+                leaf_value = self._expand(game, len(stack), *self.predict(game))
+        finally:
+            for _ in stack:
+                game.pop()
 
-            if self.Es[s]:
-                leaf_value = 1
-                break
+        return self._backup(stack, leaf_value, virtual)
 
-            if s not in self.Ps:
-                # assuming that predict will return probability distribution
-                # over moves and a value for the board state
-                self.Ps[s], v = self.predict(game)
-
-                # masks illegal moves
-                valids = game.getValidMoves()
-                self.Ps[s] = self.Ps[s] * valids
-                sum_Ps_s = np.sum(self.Ps[s])
-
-                # normalizes move probability distribution
-                if sum_Ps_s > 0:
-                    self.Ps[s] /= sum_Ps_s
-                else:
-                    # handle errors
-                    # this block should not happen since that means the
-                    # current game state is terminal
-                    print("something went wrong")
-                    self.Ps[s] += valids
-                    self.Ps[s] /= np.sum(self.Ps[s])
-
-                self.Vs[s] = valids
-                self.Ns[s] = 0
-                leaf_value = -v
-                break
+    def search_batch(
+        self, current_game: ShogiGame, batch_size=None, inputs=None
+    ) -> int:
+        """
+        Descends batch_size times using virtual loss, evaluates all of the
+        new leaves with one forward pass and backs up every simulation
 
-            # see if this is fast enough or if iteration
-            # through len(valids) or ACTION_SIZE better
-            valids = self.Vs[s]
-            valids = np.argwhere(valids)
-            cur_best = -float("inf")
-            best_act = -1
-
-            # need to calculate the action size
-            # see using len is faster
-            for a in valids:
-                a = int(a)
-
-                q_val = self.Qsa.get((s, a))
-                if q_val:
-                    # upper confidence bound calculation
-                    u = q_val + self.c_puct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                        1 + self.Nsa[s][a]
-                    )
-                else:
-                    # can initialize to 0
-                    u = self.c_puct * self.Ps[s][a] * math.sqrt(self.Ns[s] + 1e-8)
-
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
-
-            stack.append((s, best_act))
-            game = game.getNextState(best_act)
-        for sa_tup in stack[::-1]:
-            s, a = sa_tup
-            if sa_tup in self.Qsa:
-                self.Qsa[sa_tup] = (self.Nsa[s][a] * self.Qsa[sa_tup] + leaf_value) / (
-                    self.Nsa[s][a] + 1
+        Args:
+            current_game (ShogiGame): root position
+            batch_size (int, optional): defaults to self.batch_size
+            inputs (np.ndarray, optional): buffer for the planes of the
+                leaves, defaults to the one of the tree
+
+        Returns:
+            int: number of simulations run
+        """
+        batch_size = batch_size or self.batch_size
+        if inputs is None:
+            if len(self._inputs) < batch_size:
+                self._inputs = np.empty(
+                    (batch_size,) + self._inputs.shape[1:], dtype=np.float32
                 )
-                self.Nsa[s][a] += 1
-            else:
-                self.Qsa[sa_tup] = leaf_value
-                if self.Nsa.get(s):
-                    self.Nsa[s][a] = 1
-                else:
-                    self.Nsa[s] = {a: 1}
-            self.Ns[s] += 1
+            inputs = self._inputs
+        game = current_game
+        # [stack, leaf value] of every simulation
+        simulations = []
+        # leaves to evaluate keyed by zobrist key
+        leaves = {}
+        for _ in range(batch_size):
+            stack = []
+            try:
+                leaf_value = self._select(game, stack, virtual=True)
+                if leaf_value is None:
+                    key = game.zobrist_key
+                    if key not in leaves:
+                        planes = inputs[len(leaves)]
+                        leaves[key] = _Leaf(game, len(stack), planes)
+                    leaves[key].simulations.append(len(simulations))
+            finally:
+                for _ in stack:
+                    game.pop()
+            simulations.append([stack, leaf_value])
+            # the root has to be expanded before the batch can spread out
+            if not stack:
+                break
+
+        if leaves:
+            pis, vs = self.predict_batch(torch.from_numpy(inputs[: len(leaves)]))
+            for (key, leaf), pi, v in zip(leaves.items(), pis, vs):
+                leaf_value = self._expand(None, leaf.depth, pi, v, key, leaf.valids)
+                for index in leaf.simulations:
+                    simulations[index][1] = leaf_value
+
+        for stack, leaf_value in simulations:
+            self._backup(stack, leaf_value, virtual=True)
+        return len(simulations)
+
+    def _expand(self, game, depth, pi, v, key=None, valids=None):
+        """
+        Stores the node of a newly evaluated leaf
+
+        Returns:
+            the value of the leaf from the perspective of its parent
+        """
+        if game is not None:
+            key = game.zobrist_key
+            valids = game.getValidMoves()
+        # masks illegal moves and normalizes the priors
+        node = Node.from_policy(pi, valids)
+        with self._table_lock:
+            # another thread may have expanded the leaf first
+            if key not in self.table:
+                self.table.store(key, node, depth)
+        return -float(v)
+
+    def _backup(self, stack: list, leaf_value, virtual=False):
+        for node, index in stack[::-1]:
+            with self._node_lock(node):
+                if virtual:
+                    node.remove_virtual_loss(index)
+                node.visits[index] += 1
+                node.values[index] += leaf_value
+                node.n += 1
             leaf_value = -leaf_value
 
         return leaf_value
 
-    # given the string representation, get visit count policy
-    def getPolicy(self, state: str):
-        action_dict = self.Nsa[state]
+    def _select(self, game: ShogiGame, stack: list, virtual=False):
+        """
+        Descends from game to a leaf, pushing the selected moves onto game
+        and recording the (node, action) pairs in stack
+
+        Args:
+            game (ShogiGame): root position, left at the leaf
+            stack (list): accumulator of the (node, action index) pairs
+            virtual (bool, optional): add virtual loss to the selected edges
+
+        Returns:
+            the value of a terminal leaf from the perspective of its parent,
+            or None if the leaf still has to be evaluated
+        """
+        while True:
+            s = game.zobrist_key
+            with self._table_lock:
+                node = self.table.get(s)
+
+            if node is None:
+                if game.getGameEnded():
+                    with self._table_lock:
+                        self.table.store(s, Node(terminal=True), len(stack))
+                    return 1
+                return None
+
+            if node.terminal:
+                return 1
+
+            with self._node_lock(node):
+                best = self._best_action(node)
+                if virtual:
+                    node.add_virtual_loss(best)
+            stack.append((node, best))
+            game.push(action_to_move(node.actions[best]))
+
+    def _node_lock(self, node: Node):
+        if self._node_locks is None:
+            return _NO_LOCK
+        # addresses are aligned to 16 bytes, so the low bits are dropped
+        return self._node_locks[(id(node) >> 4) % NODE_LOCKS]
+
+    def _roots(self, key: int, peek=False) -> list:
+        # root nodes of this tree and of the root parallel trees
+        searchers = [self] + self._helpers
+        if peek:
+            roots = [searcher.table.peek(key) for searcher in searchers]
+        else:
+            roots = [searcher.table.get(key) for searcher in searchers]
+        return [root for root in roots if root is not None]
+
+    def _best_action(self, node: Node) -> int:
+        """
+        Scores every edge of node with the upper confidence bound at once
+
+        Returns:
+            int: index of the best action in node.actions
+        """
+        sqrt_n = math.sqrt(node.n + node.virtual_n + 1e-8)
+        visits, values = node.visits, node.values
+        if node.virtual_n:
+            # pending simulations count as losses
+            visits = visits + node.virtual
+            values = values - self.virtual_loss * node.virtual
+        # unvisited actions have a value sum and so a q value of 0
+        q = values / np.maximum(visits, 1)
+        # upper confidence bound calculation
+        u = q + (self.c_puct * sqrt_n) * node.priors / (visits + 1)
+        return int(np.argmax(u))
+
+    def advance(self, game: ShogiGame):
+        """
+        Promotes game, usually a child or grandchild of the previous root,
+        to the root of the tree after moves are played. Its subtree keeps
+        its visit counts and priors, while the nodes that can't be reached
+        from it anymore are freed.
+
+        Args:
+            game (ShogiGame): position after the moves
+        """
+        depths = {}
+        self._collect_subtree(game, 0, depths)
+        self.table.retain(depths)
+        # ages the transposition table once per move played
+        self.table.new_generation()
+        for helper in self._helpers:
+            helper.advance(game)
+
+    def _collect_subtree(self, game: ShogiGame, depth: int, depths: dict):
+        key = game.zobrist_key
+        if depths.get(key, depth + 1) <= depth:
+            return
+        node = self.table.peek(key)
+        if node is None:
+            return
+        depths[key] = depth
+        for a in node.visited()[0]:
+            game.push(action_to_move(a))
+            try:
+                self._collect_subtree(game, depth + 1, depths)
+            finally:
+                game.pop()
+
+    # given the game state, get visit count policy
+    def getPolicy(self, game: ShogiGame):
+        actions, probs = self.getSparsePolicy(game)
         policy = np.zeros(ACTION_SIZE)
-        for action, count in action_dict.items():
-            policy[action] = count
-        return policy / self.Ns[state]
+        policy[actions] = probs
+        return policy
+
+    # visit count policy over the visited actions only
+    def getSparsePolicy(self, game: ShogiGame):
+        roots = self._roots(game.zobrist_key)
+        if len(roots) == 1:
+            actions, visits = roots[0].visited()
+            return actions, visits / roots[0].n
+        # the trees of a position share the order of its actions
+        visits = sum(root.visits for root in roots)
+        indices = np.flatnonzero(visits)
+        n = sum(root.n for root in roots)
+        return roots[0].actions[indices], visits[indices] / n
+
+
+class _Leaf:
+    """
+    Leaf waiting for evaluation in search_batch
+    """
+
+    __slots__ = ("valids", "depth", "simulations")
+
+    def __init__(self, game: ShogiGame, depth: int, inputs: np.ndarray):
+        # planes are written straight into the batch buffer
+        game.encode(inputs)
+        self.valids = game.getValidMoves()
+        self.depth = depth
+        # indices of the simulations that reached the leaf
+        self.simulations = []
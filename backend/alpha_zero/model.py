@@ -1,6 +1,8 @@
+import os
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch import optim
 import sys
 
 sys.path.append("./..")
@@ -103,3 +105,31 @@ class ResCNN(nn.Module):
             input = res_block(input)
 
         return self.policy_head(input), self.value_head(input)
+
+
+def save_checkpoint(
+    nnet: ResCNN, optimizer: optim.Optimizer, filename="checkpoint.pth"
+):
+    if not os.path.exists("checkpoints"):
+        os.mkdir("checkpoints")
+    torch.save(
+        {
+            "model_state_dict": nnet.state_dict(),
+            "optimizer_state_dict": optimizer.state_dict(),
+        },
+        os.path.join("checkpoints", filename),
+    )
+
+
+def load_checkpoint(
+    nnet: ResCNN, path="checkpoints/checkpoint.pth", optimizer: optim.Optimizer = None
+):
+    # look into map location
+    checkpoint = torch.load(path, map_location=torch.device("cpu"))
+
+    if len(checkpoint["model_state_dict"]) != len(nnet.state_dict()):
+        raise ValueError("Invalid number of layers.")
+
+    nnet.load_state_dict(checkpoint["model_state_dict"])
+    if optimizer:
+        optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
@@ -0,0 +1,76 @@
+import sys
+import numpy as np
+import torch
+
+sys.path.append("./..")
+from variables import ACTION_SIZE
+from transposition import ACTION_DTYPE
+
+"""
+Policy targets are stored sparsely as (actions, weights) pairs instead of
+dense ACTION_SIZE vectors, since imitation targets are one-hot and visit
+counts only cover the explored actions. collate_examples batches them as
+padded index and weight tensors, which policy_loss consumes with a gather.
+"""
+
+
+def sparse_policy(actions, weights) -> tuple:
+    """
+    Builds a sparse policy target
+
+    Args:
+        actions (ArrayLike): action ids with a nonzero probability
+        weights (ArrayLike): probability of each action
+
+    Returns:
+        tuple: actions and weights arrays
+    """
+    return (
+        np.asarray(actions, dtype=ACTION_DTYPE),
+        np.asarray(weights, dtype=np.float32),
+    )
+
+
+def one_hot_policy(action: int) -> tuple:
+    return sparse_policy([int(action)], [1])
+
+
+def densify_policy(policy: tuple) -> np.ndarray:
+    actions, weights = policy
+    dense = np.zeros(ACTION_SIZE)
+    dense[actions] = weights
+    return dense
+
+
+def collate_examples(batch: list) -> tuple:
+    """
+    Collates (board tensor, sparse policy, value) examples, padding the
+    policies to the widest one in the batch with zero weights
+
+    Args:
+        batch (list): examples
+
+    Returns:
+        tuple: boards tensor, (indices, weights) tensors and values tensor
+    """
+    boards, policies, values = zip(*batch)
+    lengths = np.array([len(actions) for actions, _ in policies])
+    rows = np.repeat(np.arange(len(batch)), lengths)
+    # position of every entry within its own policy
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    indices = np.zeros((len(batch), lengths.max()), dtype=np.int64)
+    weights = np.zeros((len(batch), lengths.max()), dtype=np.float32)
+    indices[rows, cols] = np.concatenate([actions for actions, _ in policies])
+    weights[rows, cols] = np.concatenate([probs for _, probs in policies])
+    return (
+        torch.stack(boards),
+        (torch.from_numpy(indices), torch.from_numpy(weights)),
+        torch.tensor(values, dtype=torch.float32),
+    )
+
+
+def dense_policies(indices: torch.Tensor, weights: torch.Tensor) -> torch.Tensor:
+    # densifies collated policies on the batch tensor
+    dense = torch.zeros(indices.size()[0], ACTION_SIZE, device=weights.device)
+    return dense.scatter_add_(1, indices, weights)
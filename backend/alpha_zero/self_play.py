@@ -0,0 +1,258 @@
+import argparse
+import sys
+from queue import Empty, Full
+from time import perf_counter
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch import optim
+
+sys.path.append("./..")
+from alpha_zero_training import episode, train
+from mcts_iter import MCTS
+from model import ResCNN
+from policy_targets import collate_examples
+
+"""
+Parallel self-play. Every worker process owns a CPU copy of the network
+and an MCTS, plays games on its own and sends the examples of finished
+games to the trainer process, which keeps them in a bounded replay buffer.
+The trainer publishes new weights through a shared memory copy of the
+network that the workers reload between games.
+
+Usage (from the alpha_zero folder):
+    python self_play.py --workers 4 --games 8 --sims 50 --layers 2
+"""
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the latest (board tensor, policy, value) examples, so
+    the oldest self-play positions are replaced first
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.games = 0
+        self._examples = []
+        self._next = 0
+
+    def __len__(self):
+        return len(self._examples)
+
+    def add(self, examples: list):
+        for example in examples:
+            if len(self._examples) < self.capacity:
+                self._examples.append(example)
+            else:
+                self._examples[self._next] = example
+            self._next = (self._next + 1) % self.capacity
+        self.games += 1
+
+    def examples(self) -> list:
+        # list of examples in the format expected by train
+        return self._examples
+
+    def sample(self, batch_size: int):
+        """
+        Samples a batch of examples uniformly
+
+        Args:
+            batch_size (int): number of examples
+
+        Returns:
+            tuple: batch collated by collate_examples
+        """
+        samples = np.random.randint(len(self._examples), size=batch_size)
+        return collate_examples([self._examples[i] for i in samples])
+
+
+def _self_play_worker(
+    shared_nnet: ResCNN,
+    version,
+    lock,
+    queue,
+    stop,
+    sims,
+    mcts_batch_size,
+    max_moves,
+    seed,
+):
+    # workers scale with cores, not with threads inside one process
+    torch.set_num_threads(1)
+    np.random.seed(seed)
+    # the trainer may stop before the queue is drained
+    queue.cancel_join_thread()
+
+    nnet = ResCNN(shared_nnet.layers)
+    mcts = MCTS(nnet, batch_size=mcts_batch_size)
+    local_version = -1
+    while not stop.is_set():
+        if version.value != local_version:
+            with lock:
+                nnet.load_state_dict(shared_nnet.state_dict())
+                local_version = version.value
+        # stored evaluations may come from older weights
+        mcts.table.clear()
+        examples = episode(nnet, sims, mcts, verbose=False, max_moves=max_moves)
+        # numpy arrays are pickled instead of sharing a file per tensor
+        game = [(board.numpy(), policy, value) for board, policy, value in examples]
+        while not stop.is_set():
+            try:
+                queue.put((local_version, game), timeout=1)
+                break
+            except Full:
+                continue
+
+
+class SelfPlayWorkers:
+    """
+    Runs self-play games in num_workers processes, collecting the examples
+    of finished games into a ReplayBuffer
+    """
+
+    def __init__(
+        self,
+        nnet: ResCNN,
+        num_workers: int,
+        sims: int,
+        buffer_size=500000,
+        mcts_batch_size=8,
+        max_moves=500,
+        seed=0,
+    ):
+        ctx = mp.get_context("spawn")
+        self.num_workers = num_workers
+        self.buffer = ReplayBuffer(buffer_size)
+        # weights version the last collected game was played with
+        self.latest_version = None
+
+        self._shared_nnet = ResCNN(nnet.layers)
+        self._shared_nnet.load_state_dict(nnet.state_dict())
+        self._shared_nnet.share_memory()
+        self._version = ctx.Value("i", 0)
+        self._lock = ctx.Lock()
+        # bounded so workers wait instead of piling up games in memory
+        self._queue = ctx.Queue(2 * num_workers)
+        self._stop = ctx.Event()
+        self._processes = [
+            ctx.Process(
+                target=_self_play_worker,
+                args=(
+                    self._shared_nnet,
+                    self._version,
+                    self._lock,
+                    self._queue,
+                    self._stop,
+                    sims,
+                    mcts_batch_size,
+                    max_moves,
+                    seed + i,
+                ),
+                daemon=True,
+            )
+            for i in range(num_workers)
+        ]
+        self._start_time = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self._start_time = perf_counter()
+        for process in self._processes:
+            process.start()
+
+    def stop(self):
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def update_weights(self, nnet: ResCNN):
+        """
+        Publishes new weights, which the workers load before their next game
+
+        Args:
+            nnet (ResCNN): network with the new weights
+        """
+        with self._lock:
+            self._shared_nnet.load_state_dict(nnet.state_dict())
+            self._version.value += 1
+
+    def collect(self, games: int, timeout=None) -> int:
+        """
+        Waits for games finished games and adds them to the replay buffer
+
+        Args:
+            games (int): number of games to wait for
+            timeout (float, optional): seconds to wait for each game
+
+        Returns:
+            int: number of examples added
+        """
+        added = 0
+        for _ in range(games):
+            try:
+                self.latest_version, game = self._queue.get(timeout=timeout)
+            except Empty:
+                raise TimeoutError("No self-play game finished in time.")
+            self.buffer.add([(torch.from_numpy(board), pi, v) for board, pi, v in game])
+            added += len(game)
+        return added
+
+    def games_per_hour(self) -> float:
+        elapsed = perf_counter() - self._start_time
+        return self.buffer.games * 3600 / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel self-play")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--games", type=int, default=8, help="games to play")
+    parser.add_argument("--sims", type=int, default=50)
+    parser.add_argument("--layers", type=int, default=19)
+    parser.add_argument("--max-moves", type=int, default=500)
+    parser.add_argument("--buffer-size", type=int, default=500000)
+    parser.add_argument(
+        "--train-every",
+        type=int,
+        default=0,
+        help="train and publish new weights every n games, 0 to only play",
+    )
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    nnet = ResCNN(args.layers)
+    opt = optim.Adam(nnet.parameters())
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    with SelfPlayWorkers(
+        nnet,
+        args.workers,
+        args.sims,
+        buffer_size=args.buffer_size,
+        max_moves=args.max_moves,
+    ) as workers:
+        step = args.train_every or args.games
+        played = 0
+        while played < args.games:
+            games = min(step, args.games - played)
+            workers.collect(games)
+            played += games
+            print(
+                f"{workers.buffer.games} games, {len(workers.buffer)} examples, "
+                f"{workers.games_per_hour():.1f} games/hour"
+            )
+            if args.train_every and len(workers.buffer) >= args.batch_size:
+                train(workers.buffer.examples(), nnet, opt, 1, args.batch_size, device)
+                nnet.cpu()
+                workers.update_weights(nnet)
+
+
+if __name__ == "__main__":
+    main()
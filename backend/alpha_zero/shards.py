@@ -0,0 +1,365 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import numpy as np
+import torch
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+sys.path.append("./..")
+from csa import csa_to_move
+from encoding import (
+    HISTORY,
+    INPUT_PLANES,
+    POSITION_DTYPE,
+    encode_packed,
+    pack_position,
+)
+from move_conversion import move_to_action
+from policy_targets import sparse_policy
+from shogi_game import ShogiGame
+from transposition import ACTION_DTYPE
+from usi import fen_to_game
+
+"""
+Training examples stored as fixed size binary records, split into shards
+of at most shard_size records. A record holds the packed last HISTORY
+positions (oldest first), a policy over at most POLICY_ACTIONS actions
+(the action played, or the merged moves of duplicates, see dedup.py) and
+the value target, so a shard is read through np.memmap and an example
+only costs a plane expansion instead of parsing SFENs and replaying moves.
+
+PackedShardDataset and ShardStream go further and leave the records packed
+until collate_records expands a whole batch at once, so memory use doesn't
+grow with the dataset and DataLoader workers share the mapped pages.
+
+Usage (from the alpha_zero folder), converting the shogidb2 csv files:
+    python shards.py shogidb2/queries shogidb2/shards
+"""
+
+# actions kept in the policy of a record, zero weights pad the rest
+POLICY_ACTIONS = 8
+RECORD_DTYPE = np.dtype(
+    [
+        ("positions", POSITION_DTYPE, (HISTORY,)),
+        ("actions", ACTION_DTYPE, (POLICY_ACTIONS,)),
+        ("weights", np.float32, (POLICY_ACTIONS,)),
+        ("value", np.float32),
+    ]
+)
+SHARD_SIZE = 1 << 20
+SHARD_PATTERN = "shard_*.bin"
+
+
+def pack_example(game: ShogiGame, action: int, value: float, out=None):
+    """
+    Packs a training example, following prev_state for the history
+
+    Args:
+        game (ShogiGame): position to move from
+        action (int): action played
+        value (float): value target
+        out (NDArray, optional): RECORD_DTYPE record to write to
+
+    Returns:
+        NDArray: the packed record
+    """
+    if out is None:
+        out = np.zeros((), dtype=RECORD_DTYPE)
+    positions = out["positions"]
+    for position in positions[::-1]:
+        pack_position(game.board, game.current_player, game.captured_pieces, position)
+        game = game.prev_state
+    out["actions"] = 0
+    out["weights"] = 0
+    out["actions"][0] = action
+    out["weights"][0] = 1
+    out["value"] = value
+    return out
+
+
+class ShardWriter:
+    """
+    Appends records to numbered shards in a directory, starting a new shard
+    every shard_size records
+    """
+
+    def __init__(self, directory: str, shard_size=SHARD_SIZE, buffer_size=4096):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.records = 0
+        self._buffer = np.zeros(buffer_size, dtype=RECORD_DTYPE)
+        self._buffered = 0
+        self._shard = None
+        self._shard_records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, game: ShogiGame, action: int, value: float):
+        pack_example(game, action, value, self._buffer[self._buffered])
+        self._buffered += 1
+        if self._buffered == len(self._buffer):
+            self.flush()
+
+    def write(self, records: np.ndarray):
+        """
+        Appends packed records after the added examples
+
+        Args:
+            records (np.ndarray): RECORD_DTYPE records
+        """
+        self.flush()
+        self._write(records)
+
+    def flush(self):
+        self._write(self._buffer[: self._buffered])
+        self._buffered = 0
+
+    def _write(self, records: np.ndarray):
+        while len(records):
+            if self._shard is None or self._shard_records == self.shard_size:
+                self._next_shard()
+            count = min(len(records), self.shard_size - self._shard_records)
+            records[:count].tofile(self._shard)
+            self._shard_records += count
+            self.records += count
+            records = records[count:]
+
+    def close(self):
+        self.flush()
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+
+    def _next_shard(self):
+        if self._shard is not None:
+            self._shard.close()
+        shards = len(glob.glob(os.path.join(self.directory, SHARD_PATTERN)))
+        path = os.path.join(self.directory, f"shard_{shards:05d}.bin")
+        self._shard = open(path, "wb")
+        self._shard_records = 0
+
+
+def open_shards(directory: str) -> list:
+    """
+    Maps the shards of a directory read only, in shard order
+
+    Args:
+        directory (str): directory written by ShardWriter
+
+    Returns:
+        list: RECORD_DTYPE memmaps, one per non-empty shard
+    """
+    paths = sorted(glob.glob(os.path.join(directory, SHARD_PATTERN)))
+    return [
+        np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+        for path in paths
+        if os.path.getsize(path)
+    ]
+
+
+def truncate_shards(directory: str, records: int):
+    """
+    Drops the records written after the first records, such as the ones of
+    an interrupted run
+
+    Args:
+        directory (str): directory written by ShardWriter
+        records (int): number of records to keep
+    """
+    for path in sorted(glob.glob(os.path.join(directory, SHARD_PATTERN))):
+        size = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        if records <= 0:
+            os.remove(path)
+        elif size > records:
+            os.truncate(path, records * RECORD_DTYPE.itemsize)
+        records -= size
+
+
+def gather_records(shards: list, offsets: np.ndarray, indices) -> np.ndarray:
+    """
+    Gathers records by global index with one indexing operation per shard
+
+    Args:
+        shards (list): maps returned by open_shards
+        offsets (np.ndarray): first global index of every shard
+        indices (ArrayLike): global indices of the records
+
+    Returns:
+        np.ndarray: copies of the records
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    owners = np.searchsorted(offsets, indices, side="right") - 1
+    records = np.empty(len(indices), dtype=RECORD_DTYPE)
+    for shard in np.unique(owners):
+        rows = owners == shard
+        records[rows] = shards[shard][indices[rows] - offsets[shard]]
+    return records
+
+
+class ShardDataset(Dataset):
+    """
+    Examples of a shard directory as (board tensor, policy, value), read
+    from memory mapped shards. The maps are opened lazily so the dataset
+    can be sent to DataLoader workers, which then share the page cache.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        lengths = [len(shard) for shard in open_shards(directory)]
+        # first example of every shard
+        self._offsets = np.cumsum([0] + lengths)
+        self._shards = None
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None
+        return state
+
+    def record(self, index: int):
+        if self._shards is None:
+            self._shards = open_shards(self.directory)
+        if index < 0:
+            index += len(self)
+        shard = np.searchsorted(self._offsets, index, side="right") - 1
+        return self._shards[shard][index - self._offsets[shard]]
+
+    def __getitem__(self, index):
+        if torch.is_tensor(index):
+            index = index.tolist()
+        record = self.record(index)
+        actions, weights = record["actions"], record["weights"]
+        planes = encode_packed(record["positions"])
+        return (
+            torch.from_numpy(planes.reshape(-1, *planes.shape[2:])),
+            sparse_policy(actions[weights > 0], weights[weights > 0]),
+            float(record["value"]),
+        )
+
+
+class PackedShardDataset(ShardDataset):
+    """
+    Examples of a shard directory as packed records, to be batched with
+    collate_records. Batches are gathered from the maps with one indexing
+    operation per shard.
+    """
+
+    def __getitem__(self, index):
+        if torch.is_tensor(index):
+            index = index.tolist()
+        return self.record(index).copy()
+
+    def __getitems__(self, indices: list) -> np.ndarray:
+        if self._shards is None:
+            self._shards = open_shards(self.directory)
+        indices = np.asarray(indices, dtype=np.int64) % len(self)
+        return gather_records(self._shards, self._offsets, indices)
+
+
+class ShardStream(IterableDataset):
+    """
+    Streams the packed records of a shard directory, reading every shard
+    sequentially in chunks and shuffling within each chunk. With several
+    DataLoader workers, each worker streams its own subset of the shards.
+
+    Args:
+        directory (str): directory written by ShardWriter
+        chunk_size (int, optional): records read and shuffled at once
+        shuffle (bool, optional): shuffle the shards and the records
+        seed (int, optional): seed of the shuffling, advanced every epoch
+    """
+
+    def __init__(self, directory: str, chunk_size=65536, shuffle=True, seed=0):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def __iter__(self):
+        shards = open_shards(self.directory)
+        rng = np.random.default_rng((self.seed, self.epoch))
+        self.epoch += 1
+        order = rng.permutation(len(shards)) if self.shuffle else range(len(shards))
+        worker = get_worker_info()
+        if worker is not None:
+            order = order[worker.id :: worker.num_workers]
+        for shard in order:
+            shard = shards[shard]
+            for start in range(0, len(shard), self.chunk_size):
+                chunk = np.array(shard[start : start + self.chunk_size])
+                if self.shuffle:
+                    rng.shuffle(chunk)
+                yield from chunk
+
+
+def collate_records(records) -> tuple:
+    """
+    Collates packed records, expanding the planes of the whole batch in
+    one vectorized pass
+
+    Args:
+        records (ArrayLike): RECORD_DTYPE records
+
+    Returns:
+        tuple: boards tensor, (indices, weights) tensors and values tensor
+            in the format of collate_examples
+    """
+    records = np.asarray(records, dtype=RECORD_DTYPE)
+    planes = encode_packed(records["positions"])
+    planes = planes.reshape(len(records), INPUT_PLANES, *planes.shape[-2:])
+    indices = records["actions"].astype(np.int64)
+    return (
+        torch.from_numpy(planes),
+        (torch.from_numpy(indices), torch.from_numpy(records["weights"].copy())),
+        torch.from_numpy(records["value"].copy()),
+    )
+
+
+def convert_csvs(paths: list, directory: str, shard_size=SHARD_SIZE) -> int:
+    """
+    Converts shogidb2 csv files (see process_data_csv) into shards
+
+    Args:
+        paths (list): csv files
+        directory (str): directory to write the shards to
+        shard_size (int, optional): records per shard
+
+    Returns:
+        int: number of records written
+    """
+    with ShardWriter(directory, shard_size) as writer:
+        for path in paths:
+            with open(path, "r", newline="") as f:
+                for current_game, prev_game, suggested_move, reward in csv.reader(f):
+                    game = fen_to_game(current_game)
+                    game.prev_state = fen_to_game(prev_game)
+                    action = move_to_action(csa_to_move(suggested_move, game))
+                    writer.add(game, action, int(reward))
+    # counted once the buffered records are written by close
+    return writer.records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert csv examples to shards")
+    parser.add_argument("csv_dir", help="folder of csv files")
+    parser.add_argument("shard_dir", help="folder to write the shards to")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.csv_dir, "*.csv")))
+    records = convert_csvs(paths, args.shard_dir, args.shard_size)
+    print(f"wrote {records} records from {len(paths)} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append("../")
+sys.path.append("../../")
+from csa import csa_to_move
+from move_conversion import move_to_action
+from shards import SHARD_SIZE, ShardWriter, truncate_shards
+from shogi_game import ShogiGame
+from usi import fen_to_game
+from variables import BLACK
+
+"""
+Streams shogidb2 game records into training shards. At most concurrency
+games are loaded at a time, over a pooled HTTP session or from a folder of
+<game id>.json files, and their examples are written as soon as each game
+arrives. The ids of finished games and the number of records written are
+checkpointed, so an interrupted ingestion resumes where it stopped.
+
+Usage (from the shogidb2 folder):
+    python ingest.py 100000 199999 shards --concurrency 32
+    python ingest.py 1 10 shards --source path/to/json/folder
+"""
+
+SHOGIDB2_URL = "https://api.shogidb2.com/eval/{}/default.json"
+CHECKPOINT = "checkpoint.json"
+
+
+def game_examples(game_data):
+    """
+    Yields the examples of a shogidb2 game record, like process_data_csv
+
+    Args:
+        game_data (dict): game record
+
+    Yields:
+        tuple: position with its prev_state set, action id and reward
+    """
+    if game_data.get("evals") is None:
+        return
+    moves = game_data["evals"]
+    current_player = BLACK
+    prev_game = ShogiGame()
+    for i in range(1, len(moves) - 1):
+        current_game = fen_to_game(moves[i - 1]["sfen"])
+        current_game.prev_state = prev_game
+        prev_game = current_game
+
+        best_move = moves[i]["bestmove"]
+        action = move_to_action(csa_to_move(best_move["csa"], current_game))
+        reward = (current_player * best_move["score"] > 0) * 2 - 1
+        yield current_game, action, reward
+        current_player *= -1
+
+
+def http_source(url=SHOGIDB2_URL, concurrency=16, timeout=30):
+    """
+    Loads games over one session, pooling up to concurrency connections
+
+    Args:
+        url (str, optional): url template of a game record
+        concurrency (int, optional): connections kept in the pool
+        timeout (float, optional): seconds to wait for a response
+
+    Returns:
+        function: loads the record of a game id, None if it doesn't exist
+    """
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def load(game_id):
+        response = session.get(url.format(game_id), timeout=timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    return load
+
+
+def directory_source(directory: str):
+    """
+    Loads games from <game id>.json files
+
+    Args:
+        directory (str): folder of game records
+
+    Returns:
+        function: loads the record of a game id, None if it doesn't exist
+    """
+
+    def load(game_id):
+        path = os.path.join(directory, f"{game_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    return load
+
+
+def _load(load, game_id):
+    try:
+        return game_id, load(game_id), None
+    except Exception as e:
+        return game_id, None, e
+
+
+async def game_records(ids, load, concurrency=16):
+    """
+    Loads games in threads, keeping at most concurrency loads in flight
+
+    Args:
+        ids (Iterable): game ids
+        load (function): loads the record of a game id
+        concurrency (int, optional): most games loaded at once
+
+    Yields:
+        tuple: game id, record (None if missing) and error (None if loaded),
+            in the order the loads finish
+    """
+    loop = asyncio.get_running_loop()
+    ids = iter(ids)
+    pending = set()
+    with ThreadPoolExecutor(concurrency) as executor:
+        while True:
+            # tasks are only created as earlier loads finish
+            for game_id in ids:
+                pending.add(loop.run_in_executor(executor, _load, load, game_id))
+                if len(pending) == concurrency:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+
+
+def load_checkpoint(directory: str) -> dict:
+    path = os.path.join(directory, CHECKPOINT)
+    if not os.path.exists(path):
+        return {"completed": [], "records": 0}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_checkpoint(directory: str, completed: set, records: int):
+    path = os.path.join(directory, CHECKPOINT)
+    # replaced atomically so an interruption can't leave half a checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump({"completed": sorted(completed), "records": records}, f)
+    os.replace(path + ".tmp", path)
+
+
+async def ingest(
+    ids, load, directory: str, concurrency=16, shard_size=SHARD_SIZE, every=100
+) -> dict:
+    """
+    Writes the examples of games to shards as they are loaded, resuming
+    from the checkpoint of directory
+
+    Args:
+        ids (Iterable): game ids
+        load (function): loads the record of a game id
+        directory (str): folder of the shards and the checkpoint
+        concurrency (int, optional): most games loaded at once
+        shard_size (int, optional): records per shard
+        every (int, optional): games between checkpoints
+
+    Returns:
+        dict: counts of ingested games, records and failed loads
+    """
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = load_checkpoint(directory)
+    completed = set(checkpoint["completed"])
+    # records written after the checkpoint belong to unfinished games
+    truncate_shards(directory, checkpoint["records"])
+    ids = [game_id for game_id in ids if game_id not in completed]
+
+    records = checkpoint["records"]
+    games = 0
+    failed = 0
+    with ShardWriter(directory, shard_size) as writer:
+        async for game_id, game_data, error in game_records(ids, load, concurrency):
+            if error is not None:
+                # retried by the next run
+                print(f"game {game_id} failed: {error}")
+                failed += 1
+                continue
+            if game_data is not None:
+                for game, action, reward in game_examples(game_data):
+                    writer.add(game, action, reward)
+                games += 1
+            completed.add(game_id)
+            if len(completed) % every == 0:
+                writer.flush()
+                save_checkpoint(directory, completed, records + writer.records)
+        writer.flush()
+        save_checkpoint(directory, completed, records + writer.records)
+    return {"games": games, "records": writer.records, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest shogidb2 games to shards")
+    parser.add_argument("start", type=int, help="first game id")
+    parser.add_argument("end", type=int, help="last game id")
+    parser.add_argument("directory", help="folder to write the shards to")
+    parser.add_argument(
+        "--source",
+        default=SHOGIDB2_URL,
+        help="url template of a game record, or a folder of json records",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        load = directory_source(args.source)
+    else:
+        load = http_source(args.source, args.concurrency)
+    ids = range(args.start, args.end + 1)
+    counts = asyncio.run(
+        ingest(ids, load, args.directory, args.concurrency, args.shard_size)
+    )
+    print(
+        f"ingested {counts['games']} games, {counts['records']} records, "
+        f"{counts['failed']} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
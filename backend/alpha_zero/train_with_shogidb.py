@@ -1,12 +1,15 @@
+import argparse
+import os
 import sys
 
 sys.path.append("./..")
-from shogidb2.generate_examples import retrieve_games, load_example
+from shogidb2.generate_examples import retrieve_games
 from time import time, sleep
 import torch
-from torch.utils.data import Dataset, DataLoader, random_split
+from torch.utils.data import DataLoader
 from model import ResCNN
 from alpha_zero_training import train, train_with_dataloader
+from training_data import CSV_DIR, SHARD_DIR, load_data
 from multiprocessing import Process, SimpleQueue as Queue
 from torch import optim
 import matplotlib.pyplot as plt
@@ -36,35 +39,6 @@ def train_with_queue(queue, nn, opt, epochs, batch_size, device):
     return
 
 
-import pandas as pd
-import glob
-import os
-
-
-class MovesDataset(Dataset):
-    def __init__(self, filepath):
-        self.moves_frame = pd.concat(
-            (
-                pd.read_csv(
-                    f, names=["Current Game", "Previous Game", "Best Move", "Reward"]
-                )
-                for f in glob.glob(os.path.join(filepath, "*.csv"))
-            ),
-            ignore_index=True,
-        )
-
-    def __len__(self):
-        return len(self.moves_frame)
-
-    def __getitem__(self, index):
-        if torch.is_tensor(index):
-            index = index.tolist()
-
-        moves = self.moves_frame.iloc[index].to_list()
-        moves = load_example(*moves)
-        return moves
-
-
 def incremental_fetch(nn: ResCNN, opt: optim.Optimizer, device: torch.device):
     q = Queue()
     get_p = Process(target=retrieve_games_wrapper, args=(723599, 723601, q))
@@ -77,16 +51,9 @@ def incremental_fetch(nn: ResCNN, opt: optim.Optimizer, device: torch.device):
     print(f"Training took {time() - start} seconds.")
 
 
-def load_data(data_dir):
-    dataset = MovesDataset(data_dir)
-    train_length = len(dataset) // 3 * 2
-    train_set, test_set = random_split(
-        dataset, [train_length, len(dataset) - train_length]
-    )
-    return train_set, test_set
-
-
-def train_with_tuning(config, data_dir=None, checkpoint_dir=None):
+def train_with_tuning(
+    config, shard_dir=SHARD_DIR, csv_dir=CSV_DIR, checkpoint_dir=None
+):
     nn = ResCNN(config["layers"])
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     opt = optim.Adam(nn.parameters(), lr=config["lr"])
@@ -98,13 +65,14 @@ def train_with_tuning(config, data_dir=None, checkpoint_dir=None):
         nn.load_state_dict(model_state)
         opt.load_state_dict(optimizer_state)
 
-    train_set, test_set = load_data(data_dir)
+    train_set, test_set, collate_fn = load_data(shard_dir, csv_dir)
 
     train_loader = DataLoader(
         train_set,
         batch_size=config["batch_size"],
         shuffle=True,
         pin_memory=str(device) != "cpu",
+        collate_fn=collate_fn,
     )
     # test_loader = DataLoader(test_set, batch_size=config["batch_size"], shuffle=False)
 
@@ -118,14 +86,18 @@ def train_with_tuning(config, data_dir=None, checkpoint_dir=None):
     # return losses
 
 
-def train_without_tuning(batch_size, epochs):
+def train_without_tuning(batch_size, epochs, shard_dir=SHARD_DIR, csv_dir=CSV_DIR):
     nn = ResCNN(19)
     opt = optim.Adam(nn.parameters())
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
-    train_set, test_set = load_data(os.path.join("shogidb2", "queries"))
+    train_set, test_set, collate_fn = load_data(shard_dir, csv_dir)
     train_loader = DataLoader(
-        train_set, batch_size=batch_size, shuffle=True, pin_memory=str(device) != "cpu"
+        train_set,
+        batch_size=batch_size,
+        shuffle=True,
+        pin_memory=str(device) != "cpu",
+        collate_fn=collate_fn,
     )
 
     losses = train_with_dataloader(train_loader, nn, opt, epochs, device)
@@ -142,8 +114,7 @@ def train_without_tuning(batch_size, epochs):
 from functools import partial
 
 
-def hyperparam_tuning():
-    data_dir = os.path.join("shogidb2", "queries")
+def hyperparam_tuning(shard_dir=SHARD_DIR, csv_dir=CSV_DIR):
     config = {
         "layers": tune.grid_search([2, 4, 6, 9, 12]),
         "lr": tune.loguniform(1e-4, 7e-4),
@@ -156,7 +127,7 @@ def hyperparam_tuning():
 
     reporter = CLIReporter(metric_columns=["loss", "training_iteration"])
     result = tune.run(
-        partial(train_with_tuning, data_dir=data_dir),
+        partial(train_with_tuning, shard_dir=shard_dir, csv_dir=csv_dir),
         config=config,
         num_samples=10,
         scheduler=scheduler,
@@ -171,6 +142,22 @@ def hyperparam_tuning():
     print(os.path.join(best_trial.checkpoint.value, "checkpoint"))
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Train on the shogidb2 games")
+    parser.add_argument("--shards", default=SHARD_DIR, help="folder of shards")
+    parser.add_argument(
+        "--csvs", default=CSV_DIR, help="folder of csv files, used without shards"
+    )
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--tune", action="store_true", help="tune hyperparameters")
+    args = parser.parse_args()
+
+    if args.tune:
+        hyperparam_tuning(args.shards, args.csvs)
+    else:
+        train_without_tuning(args.batch_size, args.epochs, args.shards, args.csvs)
+
+
 if __name__ == "__main__":
-    # hyperparam_tuning()
-    train_without_tuning(256, 10)
+    main()
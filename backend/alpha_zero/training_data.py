@@ -0,0 +1,74 @@
+import glob
+import os
+import sys
+import torch
+from torch.utils.data import Dataset, random_split
+
+sys.path.append("./..")
+from policy_targets import collate_examples
+from shards import PackedShardDataset, collate_records, open_shards
+
+"""
+Training data of the shogidb2 games. load_data reads the binary shards
+written by shards.py or ingest.py, and only falls back to parsing the csv
+files of generate_examples.py when there are no shards.
+"""
+
+SHARD_DIR = os.path.join("shogidb2", "shards")
+CSV_DIR = os.path.join("shogidb2", "queries")
+
+
+class MovesDataset(Dataset):
+    def __init__(self, filepath):
+        # only needed for the csv fallback
+        import pandas as pd
+        from shogidb2.generate_examples import load_example
+
+        self.load_example = load_example
+        self.moves_frame = pd.concat(
+            (
+                pd.read_csv(
+                    f, names=["Current Game", "Previous Game", "Best Move", "Reward"]
+                )
+                for f in glob.glob(os.path.join(filepath, "*.csv"))
+            ),
+            ignore_index=True,
+        )
+
+    def __len__(self):
+        return len(self.moves_frame)
+
+    def __getitem__(self, index):
+        if torch.is_tensor(index):
+            index = index.tolist()
+
+        moves = self.moves_frame.iloc[index].to_list()
+        moves = self.load_example(*moves)
+        return moves
+
+
+def load_data(shard_dir=SHARD_DIR, csv_dir=CSV_DIR):
+    """
+    Splits the examples into a training and a test set
+
+    Args:
+        shard_dir (str, optional): folder of shards, read if it has any
+        csv_dir (str, optional): folder of csv files, read otherwise
+
+    Returns:
+        tuple: training set, test set and the collate_fn of their batches
+    """
+    # shards are read without parsing the csv files
+    if open_shards(shard_dir):
+        dataset = PackedShardDataset(shard_dir)
+        collate_fn = collate_records
+    elif glob.glob(os.path.join(csv_dir, "*.csv")):
+        dataset = MovesDataset(csv_dir)
+        collate_fn = collate_examples
+    else:
+        raise FileNotFoundError(f"no shards in {shard_dir} or csv files in {csv_dir}")
+    train_length = len(dataset) // 3 * 2
+    train_set, test_set = random_split(
+        dataset, [train_length, len(dataset) - train_length]
+    )
+    return train_set, test_set, collate_fn
@@ -0,0 +1,255 @@
+import sys
+from collections import OrderedDict
+import numpy as np
+
+sys.path.append("./..")
+from variables import ACTION_SIZE
+
+# rough memory cost of a node and its six array headers, used to enforce
+# the memory budget
+NODE_OVERHEAD_BYTES = 800
+
+ACTION_DTYPE = np.int16 if ACTION_SIZE < np.iinfo(np.int16).max else np.int32
+# action id, plus its prior, visit count, value sum and pending simulations
+BYTES_PER_ACTION = np.dtype(ACTION_DTYPE).itemsize + 4 * 4
+
+
+class Node:
+    """
+    Statistics stored for a position in the search tree. Every array is
+    aligned with actions, which holds the legal action ids, so a node costs
+    O(legal moves) instead of O(ACTION_SIZE) and the statistics of all of
+    its edges can be scored with vectorized operations.
+    """
+
+    __slots__ = (
+        "actions",
+        "priors",
+        "terminal",
+        "n",
+        "visits",
+        "values",
+        "virtual",
+        "virtual_n",
+        "depth",
+        "generation",
+        "size",
+    )
+
+    def __init__(self, actions=None, priors=None, terminal=False):
+        if actions is None:
+            actions = np.empty(0, dtype=ACTION_DTYPE)
+            priors = np.empty(0, dtype=np.float32)
+        self.actions = actions.astype(ACTION_DTYPE, copy=False)
+        self.priors = priors.astype(np.float32, copy=False)
+        self.terminal = terminal
+        self.n = 0  # times the node is visited
+        self.visits = np.zeros(len(actions), dtype=np.int32)  # per action
+        self.values = np.zeros(len(actions), dtype=np.float32)  # value sums
+        self.virtual = np.zeros(len(actions), dtype=np.int32)  # pending sims
+        self.virtual_n = 0  # pending simulations through the node
+        self.depth = 0
+        self.generation = 0
+        self.size = NODE_OVERHEAD_BYTES + len(self.actions) * BYTES_PER_ACTION
+
+    @classmethod
+    def from_policy(cls, policy: np.ndarray, valids: np.ndarray):
+        """
+        Builds a node from a dense policy and valid move vector
+
+        Args:
+            policy (np.ndarray): policy over ACTION_SIZE actions
+            valids (np.ndarray): one-hot vector of valid actions
+
+        Returns:
+            Node: node with normalized sparse priors
+        """
+        actions = np.flatnonzero(valids)
+        priors = policy[actions]
+        total = np.sum(priors)
+        if total > 0:
+            priors = priors / total
+        else:
+            # should not happen since that means the position is terminal
+            print("something went wrong")
+            priors = np.full(len(actions), 1 / max(len(actions), 1))
+        return cls(actions, priors)
+
+    def add_virtual_loss(self, index: int):
+        self.virtual[index] += 1
+        self.virtual_n += 1
+
+    def remove_virtual_loss(self, index: int):
+        self.virtual[index] -= 1
+        self.virtual_n -= 1
+
+    def visited(self) -> tuple:
+        """
+        Gets the explored edges of the node
+
+        Returns:
+            tuple: action ids and visit counts of the visited actions
+        """
+        indices = np.flatnonzero(self.visits)
+        return self.actions[indices], self.visits[indices]
+
+    def dense_priors(self) -> np.ndarray:
+        priors = np.zeros(ACTION_SIZE)
+        priors[self.actions] = self.priors
+        return priors
+
+
+class TranspositionTable:
+    """
+    Maps zobrist keys to Nodes within a memory budget
+
+    Replacement policies:
+        "lru": evicts the least recently used node
+        "depth": evicts the deepest nodes first (least recently used
+            among them), keeping the expensive nodes near the root
+    Aging: every call to new_generation (once per move played) drops the
+    nodes that haven't been used for max_age generations.
+    """
+
+    POLICIES = ("lru", "depth")
+
+    def __init__(self, max_memory_mb=512, policy="lru", max_age=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown replacement policy {policy}.")
+        self.max_bytes = int(max_memory_mb * 2**20)
+        self.policy = policy
+        self.max_age = max_age
+        self.generation = 0
+        self.memory = 0
+
+        self._entries = {}
+        # keys in least recently used order, grouped by depth for "depth"
+        self._buckets = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _bucket(self, node: Node) -> OrderedDict:
+        depth = node.depth if self.policy == "depth" else 0
+        bucket = self._buckets.get(depth)
+        if bucket is None:
+            bucket = self._buckets[depth] = OrderedDict()
+        return bucket
+
+    def get(self, key: int) -> Node:
+        """
+        Looks up a node, marking it as recently used
+
+        Args:
+            key (int): zobrist key of the position
+
+        Returns:
+            Node: stored node or None
+        """
+        node = self._entries.get(key)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        node.generation = self.generation
+        self._bucket(node).move_to_end(key)
+        return node
+
+    def store(self, key: int, node: Node, depth=0):
+        """
+        Stores a node, evicting others if the memory budget is exceeded
+
+        Args:
+            key (int): zobrist key of the position
+            node (Node): node to store
+            depth (int, optional): distance from the search root
+        """
+        if key in self._entries:
+            self._remove(key)
+        node.depth = depth
+        node.generation = self.generation
+        self._entries[key] = node
+        self._bucket(node)[key] = None
+        self.memory += node.size
+        while self.memory > self.max_bytes and len(self._entries) > 1:
+            self._evict()
+
+    def _remove(self, key: int) -> Node:
+        node = self._entries.pop(key)
+        bucket = self._bucket(node)
+        del bucket[key]
+        if not bucket:
+            del self._buckets[node.depth if self.policy == "depth" else 0]
+        self.memory -= node.size
+        return node
+
+    def _evict(self):
+        bucket = self._buckets[max(self._buckets)]
+        key = next(iter(bucket))
+        self._remove(key)
+        self.evictions += 1
+
+    def peek(self, key: int) -> Node:
+        # looks up a node without counting a hit or marking it as used
+        return self._entries.get(key)
+
+    def retain(self, depths: dict):
+        """
+        Frees every node missing from depths, used to drop the parts of the
+        tree that can't be reached from a new root
+
+        Args:
+            depths (dict): keys to keep mapped to their new depth
+        """
+        buckets = [self._buckets[depth] for depth in sorted(self._buckets)]
+        entries = self._entries
+        self.clear()
+        for bucket in buckets:
+            # kept nodes are reinserted in least recently used order
+            for key in bucket:
+                depth = depths.get(key)
+                if depth is not None:
+                    node = entries[key]
+                    generation = node.generation
+                    self.store(key, node, depth)
+                    node.generation = generation
+
+    def new_generation(self):
+        """
+        Starts a new generation, dropping nodes older than max_age
+        """
+        self.generation += 1
+        if self.max_age is None:
+            return
+        oldest = self.generation - self.max_age
+        for bucket in list(self._buckets.values()):
+            # buckets are ordered by last use, so stale nodes come first
+            while bucket:
+                key = next(iter(bucket))
+                if self._entries[key].generation >= oldest:
+                    break
+                self._remove(key)
+                self.evictions += 1
+
+    def clear(self):
+        self._entries = {}
+        self._buckets = {}
+        self.memory = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_mb": self.memory / 2**20,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0,
+        }
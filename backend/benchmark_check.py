@@ -0,0 +1,61 @@
+import argparse
+from time import perf_counter
+from perft import PERFT_POSITIONS
+from shogi_logic import get_moves, in_check, move_to_board, rotate_board, scan_check
+from usi import fen_to_game
+
+"""
+Compares the king-centric check detection (in_check) with the scan of every
+enemy piece it replaced (scan_check), on the boards reached by every legal
+move of the reference positions.
+
+Usage:
+    python benchmark_check.py --repeat 20
+"""
+
+
+def benchmark(boards: list, repeat: int) -> tuple:
+    """
+    Times both check detectors on the same boards
+
+    Args:
+        boards (list): (board oriented towards player, player) pairs
+        repeat (int): passes over the boards
+
+    Returns:
+        tuple: microseconds per call of in_check and of scan_check
+    """
+    rotated = [(rotate_board(board), player) for board, player in boards]
+    start = perf_counter()
+    for _ in range(repeat):
+        for board, player in boards:
+            in_check(board, player)
+    king_centric = perf_counter() - start
+    start = perf_counter()
+    for _ in range(repeat):
+        for board, player in rotated:
+            scan_check(board, player)
+    scan = perf_counter() - start
+    calls = repeat * len(boards) / 1e6
+    return king_centric / calls, scan / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check detection benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for name, (sfen, _) in PERFT_POSITIONS.items():
+        game = fen_to_game(sfen)
+        board, player = game.board, game.current_player
+        moves = get_moves(board, player, game.captured_pieces[player])
+        boards = [(move_to_board(board, player, move), player) for move in moves]
+        king_centric, scan = benchmark(boards, args.repeat)
+        print(
+            f"{name}: in_check {king_centric:.1f}us, scan_check {scan:.1f}us "
+            f"({scan / king_centric:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
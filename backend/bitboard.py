@@ -0,0 +1,490 @@
+from typing import List
+from variables import *
+from shogi_logic import Move
+import numpy as np
+from numpy.typing import NDArray
+
+"""
+Bitboard implementation of the move generator. Every set of squares is
+stored as an 81 bit python int where square = rank * BOARD_SIZE + file.
+
+Positions are described from two sides. Side 0 owns the pieces moving
+towards rank 0 and side 1 owns the pieces moving towards rank 8, which
+matches the board orientation used by shogi_logic (the player to move
+is always side 0 there).
+
+Native moves are tuples (from_sq, to_sq, promote). By convention, drops
+use the negated piece id as from_sq, mirroring the (-1, piece id)
+convention of Move.
+
+List of methods in this file:
+
+square_bit(rank, file): Gets the bit for a square
+lsb(bb): Index of the lowest set bit
+ray_attacks(direction, sq, occupied): Squares reached along a ray
+get_moves(board, player, cap_pieces): Same contract as shogi_logic.get_moves
+native_to_move(native): Converts a native move tuple into a Move
+"""
+
+SQUARES = BOARD_SIZE * BOARD_SIZE
+FULL_BOARD = (1 << SQUARES) - 1
+
+GOLD_LIKE_IDS = (GOLD_GEN_ID, PROM_SILG_ID, PROM_LANCE_ID, PROM_KNIGHT_ID, PROM_PAWN_ID)
+PROMOTABLE_IDS = (ROOK_ID, BISHOP_ID, SILVER_GEN_ID, LANCE_ID, KNIGHT_ID, PAWN_ID)
+
+
+def square_bit(rank: int, file: int) -> int:
+    return 1 << (rank * BOARD_SIZE + file)
+
+
+def lsb(bb: int) -> int:
+    return (bb & -bb).bit_length() - 1
+
+
+def _in_bounds(rank: int, file: int) -> bool:
+    return 0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE
+
+
+def _flip(move_set: List[tuple]) -> List[tuple]:
+    # side 1 moves in the opposite direction of side 0
+    return [(-rank, -file) for rank, file in move_set]
+
+
+def _rank_mask(ranks) -> int:
+    mask = 0
+    for rank in ranks:
+        for file in range(BOARD_SIZE):
+            mask |= square_bit(rank, file)
+    return mask
+
+
+# precomputed masks for every rank and file
+RANK_MASKS = [_rank_mask([rank]) for rank in range(BOARD_SIZE)]
+FILE_MASKS = [
+    sum(square_bit(rank, file) for rank in range(BOARD_SIZE))
+    for file in range(BOARD_SIZE)
+]
+
+# promotion zone of each side
+PROMOTION_ZONES = (
+    _rank_mask(range(PROMOTE_RANK + 1)),
+    _rank_mask(range(BOARD_SIZE - PROMOTE_RANK - 1, BOARD_SIZE)),
+)
+
+# squares a piece can't stay on without promoting (also used for drops)
+DEAD_SQUARES = (
+    {
+        PAWN_ID: RANK_MASKS[0],
+        LANCE_ID: RANK_MASKS[0],
+        KNIGHT_ID: RANK_MASKS[0] | RANK_MASKS[1],
+    },
+    {
+        PAWN_ID: RANK_MASKS[8],
+        LANCE_ID: RANK_MASKS[8],
+        KNIGHT_ID: RANK_MASKS[8] | RANK_MASKS[7],
+    },
+)
+
+# the eight ray directions, indexed for RAYS
+DIRECTIONS = ROOK_MOVES + BISHOP_MOVES
+# whether the square index increases along a direction
+POSITIVE_DIRECTIONS = [rank * BOARD_SIZE + file > 0 for rank, file in DIRECTIONS]
+
+
+def _build_rays() -> List[List[int]]:
+    rays = []
+    for move_rank, move_file in DIRECTIONS:
+        direction_rays = []
+        for sq in range(SQUARES):
+            rank, file = divmod(sq, BOARD_SIZE)
+            mask = 0
+            rank += move_rank
+            file += move_file
+            while _in_bounds(rank, file):
+                mask |= square_bit(rank, file)
+                rank += move_rank
+                file += move_file
+            direction_rays.append(mask)
+        rays.append(direction_rays)
+    return rays
+
+
+RAYS = _build_rays()
+
+# indices into DIRECTIONS for every sliding piece
+ROOK_DIRECTIONS = [DIRECTIONS.index(move) for move in ROOK_MOVES]
+BISHOP_DIRECTIONS = [DIRECTIONS.index(move) for move in BISHOP_MOVES]
+LANCE_DIRECTIONS = (
+    DIRECTIONS.index(LANCE_MOVES[0]),
+    DIRECTIONS.index(_flip(LANCE_MOVES)[0]),
+)
+
+
+def _step_table(move_set: List[tuple]) -> List[int]:
+    table = []
+    for sq in range(SQUARES):
+        rank, file = divmod(sq, BOARD_SIZE)
+        mask = 0
+        for move_rank, move_file in move_set:
+            if _in_bounds(rank + move_rank, file + move_file):
+                mask |= square_bit(rank + move_rank, file + move_file)
+        table.append(mask)
+    return table
+
+
+def _build_step_attacks(side: int) -> dict:
+    orient = (lambda moves: moves) if side == 0 else _flip
+    gold_table = _step_table(orient(GOLD_GEN_MOVES))
+    tables = {
+        KING_ID: _step_table(KING_MOVES),
+        SILVER_GEN_ID: _step_table(orient(SILVER_GEN_MOVES)),
+        KNIGHT_ID: _step_table(orient(KNIGHT_MOVES)),
+        PAWN_ID: _step_table(orient(PAWN_MOVES)),
+        # promoted sliders gain the steps their ray moves lack
+        PROM_ROOK_ID: _step_table(BISHOP_MOVES),
+        PROM_BISH_ID: _step_table(ROOK_MOVES),
+    }
+    for piece in GOLD_LIKE_IDS:
+        tables[piece] = gold_table
+    return tables
+
+
+# STEP_ATTACKS[side][piece][sq] is the mask of squares piece attacks from sq
+STEP_ATTACKS = (_build_step_attacks(0), _build_step_attacks(1))
+
+# ray directions used by every sliding piece
+SLIDE_DIRECTIONS = tuple(
+    {
+        ROOK_ID: ROOK_DIRECTIONS,
+        PROM_ROOK_ID: ROOK_DIRECTIONS,
+        BISHOP_ID: BISHOP_DIRECTIONS,
+        PROM_BISH_ID: BISHOP_DIRECTIONS,
+        LANCE_ID: [LANCE_DIRECTIONS[side]],
+    }
+    for side in (0, 1)
+)
+
+EMPTY_TABLE = [0] * SQUARES
+
+
+def ray_attacks(direction: int, sq: int, occupied: int) -> int:
+    """
+    Gets the squares attacked along a ray, up to and including the first
+    occupied square
+
+    Args:
+        direction (int): index into DIRECTIONS
+        sq (int): starting square
+        occupied (int): mask of occupied squares
+
+    Returns:
+        int: mask of attacked squares
+    """
+    ray = RAYS[direction][sq]
+    blockers = ray & occupied
+    if blockers:
+        if POSITIVE_DIRECTIONS[direction]:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        ray ^= RAYS[direction][blocker]
+    return ray
+
+
+def piece_attacks(side: int, piece: int, sq: int, occupied: int) -> int:
+    """
+    Gets the squares attacked by a piece
+
+    Args:
+        side (int): side owning the piece
+        piece (int): unsigned piece id
+        sq (int): square of the piece
+        occupied (int): mask of occupied squares
+
+    Returns:
+        int: mask of attacked squares
+    """
+    attacks = STEP_ATTACKS[side].get(piece, EMPTY_TABLE)[sq]
+    for direction in SLIDE_DIRECTIONS[side].get(piece, ()):
+        attacks |= ray_attacks(direction, sq, occupied)
+    return attacks
+
+
+class BitboardPosition:
+    """
+    Position stored as occupancy masks per side and per piece type
+
+    pieces[side][piece id] holds the squares of that side's pieces,
+    occupied[side] the union of them and hands[side] the pieces in hand.
+    """
+
+    __slots__ = ("pieces", "occupied", "hands")
+
+    def __init__(self, pieces: list, hands: list):
+        self.pieces = pieces
+        self.hands = hands
+        self.occupied = [0, 0]
+        for side in (0, 1):
+            for bb in pieces[side]:
+                self.occupied[side] |= bb
+
+    @classmethod
+    def from_board(
+        cls, board: NDArray, player: int, cap_pieces: dict, other_cap_pieces=None
+    ):
+        """
+        Builds a position from the 2D array used by shogi_logic. The
+        player's pieces become side 0.
+
+        Args:
+            board (NDArray): 2D array oriented towards player
+            player (int): player to move
+            cap_pieces (dict): player's captured pieces
+            other_cap_pieces (dict, optional): opponent's captured pieces
+
+        Returns:
+            BitboardPosition: equivalent position
+        """
+        pieces = [[0] * (PROM_PAWN_ID + 1), [0] * (PROM_PAWN_ID + 1)]
+        flat = np.asarray(board).ravel()
+        for sq in np.flatnonzero(flat):
+            piece = int(flat[sq]) * player
+            if piece > 0:
+                pieces[0][piece] |= 1 << int(sq)
+            else:
+                pieces[1][-piece] |= 1 << int(sq)
+        hands = [dict(cap_pieces), dict(other_cap_pieces or {})]
+        return cls(pieces, hands)
+
+    def piece_at(self, sq: int) -> tuple:
+        """
+        Returns (side, piece id) of the piece on sq or None if empty
+        """
+        bit = 1 << sq
+        for side in (0, 1):
+            if self.occupied[side] & bit:
+                for piece, bb in enumerate(self.pieces[side]):
+                    if bb & bit:
+                        return side, piece
+        return None
+
+    def king_square(self, side: int) -> int:
+        king = self.pieces[side][KING_ID]
+        return lsb(king) if king else -1
+
+    def attackers_to(
+        self, sq: int, side: int, occupied: int = None, exclude: int = 0
+    ) -> int:
+        """
+        Gets the pieces of side that attack sq
+
+        Args:
+            sq (int): attacked square
+            side (int): attacking side
+            occupied (int, optional): occupancy to use for sliding pieces
+            exclude (int, optional): mask of pieces to ignore (captured pieces)
+
+        Returns:
+            int: mask of the attacking pieces
+        """
+        if occupied is None:
+            occupied = self.occupied[0] | self.occupied[1]
+        pieces = self.pieces[side]
+        # a stepper attacks sq if the same stepper of the other side on sq
+        # would attack it back
+        steps = STEP_ATTACKS[1 - side]
+        attackers = (
+            steps[KING_ID][sq]
+            & (pieces[KING_ID] | pieces[PROM_ROOK_ID] | pieces[PROM_BISH_ID])
+            | steps[SILVER_GEN_ID][sq] & pieces[SILVER_GEN_ID]
+            | steps[KNIGHT_ID][sq] & pieces[KNIGHT_ID]
+            | steps[PAWN_ID][sq] & pieces[PAWN_ID]
+        )
+        gold_like = 0
+        for piece in GOLD_LIKE_IDS:
+            gold_like |= pieces[piece]
+        attackers |= steps[GOLD_GEN_ID][sq] & gold_like
+
+        rooks = pieces[ROOK_ID] | pieces[PROM_ROOK_ID]
+        if rooks:
+            for direction in ROOK_DIRECTIONS:
+                attackers |= ray_attacks(direction, sq, occupied) & rooks
+        bishops = pieces[BISHOP_ID] | pieces[PROM_BISH_ID]
+        if bishops:
+            for direction in BISHOP_DIRECTIONS:
+                attackers |= ray_attacks(direction, sq, occupied) & bishops
+        if pieces[LANCE_ID]:
+            direction = LANCE_DIRECTIONS[1 - side]
+            attackers |= ray_attacks(direction, sq, occupied) & pieces[LANCE_ID]
+        return attackers & ~exclude
+
+    def in_check(self, side: int) -> bool:
+        king = self.king_square(side)
+        return king != -1 and self.attackers_to(king, 1 - side) != 0
+
+    def _is_legal(self, side: int, move: tuple) -> bool:
+        """
+        Checks that move doesn't leave side's king attacked
+        """
+        from_sq, to_sq, _ = move
+        to_bit = 1 << to_sq
+        occupied = self.occupied[0] | self.occupied[1] | to_bit
+        if from_sq < 0:
+            king = self.king_square(side)
+        else:
+            occupied ^= 1 << from_sq
+            king = to_sq if self.pieces[side][KING_ID] >> from_sq & 1 else -1
+            if king == -1:
+                king = self.king_square(side)
+        if king == -1:
+            return True
+        return not self.attackers_to(king, 1 - side, occupied, to_bit)
+
+    def pseudo_legal_board_moves(self, side: int) -> List[tuple]:
+        """
+        Gets moves of pieces on the board without checking king safety
+        """
+        moves = []
+        own = self.occupied[side]
+        occupied = own | self.occupied[1 - side]
+        zone = PROMOTION_ZONES[side]
+        dead_squares = DEAD_SQUARES[side]
+        for piece in range(KING_ID, PROM_PAWN_ID + 1):
+            bb = self.pieces[side][piece]
+            can_promote = piece in PROMOTABLE_IDS
+            dead = dead_squares.get(piece, 0)
+            while bb:
+                from_bit = bb & -bb
+                bb ^= from_bit
+                from_sq = from_bit.bit_length() - 1
+                targets = piece_attacks(side, piece, from_sq, occupied) & ~own
+                while targets:
+                    to_bit = targets & -targets
+                    targets ^= to_bit
+                    to_sq = to_bit.bit_length() - 1
+                    if not to_bit & dead:
+                        moves.append((from_sq, to_sq, False))
+                    if can_promote and (from_bit | to_bit) & zone:
+                        moves.append((from_sq, to_sq, True))
+        return moves
+
+    def pseudo_legal_drops(self, side: int) -> List[tuple]:
+        """
+        Gets drops without checking king safety or pawn drop mate
+        """
+        moves = []
+        empty = ~(self.occupied[0] | self.occupied[1]) & FULL_BOARD
+        for piece, count in self.hands[side].items():
+            if count <= 0:
+                continue
+            targets = empty & ~DEAD_SQUARES[side].get(piece, 0)
+            if piece == PAWN_ID:
+                # two unpromoted pawns can't share a file
+                pawns = self.pieces[side][PAWN_ID]
+                for file_mask in FILE_MASKS:
+                    if pawns & file_mask:
+                        targets &= ~file_mask
+            while targets:
+                to_bit = targets & -targets
+                targets ^= to_bit
+                moves.append((-piece, to_bit.bit_length() - 1, False))
+        return moves
+
+    def _pawn_drop_mates(self, side: int, to_sq: int) -> bool:
+        """
+        Checks if dropping a pawn on to_sq checkmates the other side. A pawn
+        check can't be blocked, so only king moves and captures of the pawn
+        by unpinned pieces can escape it.
+        """
+        enemy = 1 - side
+        king_bit = self.pieces[enemy][KING_ID]
+        if not STEP_ATTACKS[side][PAWN_ID][to_sq] & king_bit:
+            return False
+        king = lsb(king_bit)
+        to_bit = 1 << to_sq
+        occupied = (self.occupied[0] | self.occupied[1] | to_bit) ^ king_bit
+
+        # king escapes, including capturing the pawn, which only attacks
+        # the king's square
+        targets = STEP_ATTACKS[enemy][KING_ID][king] & ~self.occupied[enemy]
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            if not self.attackers_to(lsb(bit), side, occupied | bit, bit):
+                return False
+
+        # captures of the pawn by the other pieces, unless they are pinned
+        occupied |= king_bit
+        capturers = self.attackers_to(to_sq, enemy, occupied) & ~king_bit
+        while capturers:
+            bit = capturers & -capturers
+            capturers ^= bit
+            if not self.attackers_to(king, side, occupied ^ bit):
+                return False
+        return True
+
+    def legal_moves(self, side: int = 0) -> List[tuple]:
+        """
+        Gets all legal moves of side as native move tuples
+
+        Args:
+            side (int, optional): side to move. Defaults to 0.
+
+        Returns:
+            list[tuple]: legal (from_sq, to_sq, promote) moves
+        """
+        moves = [
+            move
+            for move in self.pseudo_legal_board_moves(side)
+            if self._is_legal(side, move)
+        ]
+        for move in self.pseudo_legal_drops(side):
+            if not self._is_legal(side, move):
+                continue
+            if move[0] == -PAWN_ID and self._pawn_drop_mates(side, move[1]):
+                continue
+            moves.append(move)
+        return moves
+
+
+# Move objects are immutable, so they are shared between calls
+_move_cache = {}
+
+
+def native_to_move(native: tuple) -> Move:
+    """
+    Converts a native (from_sq, to_sq, promote) tuple into a Move
+
+    Args:
+        native (tuple): native move
+
+    Returns:
+        Move: equivalent move
+    """
+    move = _move_cache.get(native)
+    if move is None:
+        from_sq, to_sq, promote = native
+        if from_sq < 0:
+            piece = (-1, -from_sq)
+        else:
+            piece = divmod(from_sq, BOARD_SIZE)
+        move = Move(piece, divmod(to_sq, BOARD_SIZE), promote)
+        _move_cache[native] = move
+    return move
+
+
+def get_moves(board: NDArray, player: int, cap_pieces: dict) -> List[Move]:
+    """
+    Gets all moves a player can do. Drop-in replacement for
+    shogi_logic.get_moves.
+
+    Args:
+        board (NDArray): 2D array representation of board
+        player (int): current player
+        cap_pieces (dict): current player's captured pieces
+
+    Returns:
+        list[Move]: all legal moves in the position
+    """
+    position = BitboardPosition.from_board(board, player, cap_pieces)
+    return [native_to_move(move) for move in position.legal_moves()]
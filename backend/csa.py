@@ -0,0 +1,74 @@
+from shogi_game import ShogiGame
+from shogi_logic import Move, rotate_move
+from variables import (
+    BISHOP_ID,
+    BOARD_SIZE,
+    GOLD_GEN_ID,
+    KING_ID,
+    KNIGHT_ID,
+    LANCE_ID,
+    PAWN_ID,
+    PROM_BISH_ID,
+    PROM_KNIGHT_ID,
+    PROM_LANCE_ID,
+    PROM_PAWN_ID,
+    PROM_ROOK_ID,
+    PROM_SILG_ID,
+    ROOK_ID,
+    SILVER_GEN_ID,
+    WHITE,
+)
+
+"""
+Parses moves in CSA notation, as used by the shogidb2 game records
+"""
+
+csa_piece_lookup = {
+    "OU": KING_ID,
+    "KI": GOLD_GEN_ID,
+    "HI": ROOK_ID,
+    "KA": BISHOP_ID,
+    "GI": SILVER_GEN_ID,
+    "FU": PAWN_ID,
+    "KY": LANCE_ID,
+    "KE": KNIGHT_ID,
+    "RY": PROM_ROOK_ID,
+    "UM": PROM_BISH_ID,
+    "NK": PROM_KNIGHT_ID,
+    "NG": PROM_SILG_ID,
+    "TO": PROM_PAWN_ID,
+    "NY": PROM_LANCE_ID,
+}
+
+
+def convert_coords(csa_str, ind):
+    return BOARD_SIZE - int(csa_str[ind])
+
+
+def csa_to_move(csa_string, current_game: ShogiGame) -> Move:
+    """
+    Converts a CSA move (ex. +7776FU, -3334FU, +0055KA) of the player to
+    move in current_game
+
+    Args:
+        csa_string (str): move in CSA notation
+        current_game (ShogiGame): position the move is played from
+
+    Returns:
+        Move: move oriented towards the player to move
+    """
+    piece_id = csa_piece_lookup[csa_string[-2:]]
+    # CSA squares are seen from black's side
+    destination = (int(csa_string[4]) - 1, convert_coords(csa_string, 3))
+
+    # drop move
+    if csa_string[1:3] == "00":
+        move = Move((-1, piece_id), destination)
+    else:
+        start = (int(csa_string[2]) - 1, convert_coords(csa_string, 1))
+        piece = abs(current_game.fixed_board[start[0]][start[1]])
+        move = Move(start, destination, piece <= PAWN_ID and piece_id > PAWN_ID)
+
+    if current_game.current_player == WHITE:
+        move = rotate_move(move)
+    return move
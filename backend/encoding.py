@@ -0,0 +1,139 @@
+import numpy as np
+from numpy.typing import NDArray
+from typing import List
+from variables import BOARD_SIZE, GOLD_GEN_ID, KING_ID, PAWN_ID, PROM_PAWN_ID
+
+"""
+Encodes positions into the input planes of the network. Each position
+takes POSITION_PLANES planes:
+    14 planes: one-hot squares of the player's pieces, by piece id
+    14 planes: one-hot squares of the opponent's pieces, by piece id
+    7 planes: number of each piece in the player's hand
+    7 planes: number of each piece in the opponent's hand
+    1 plane: 1 if the player is black, 0 if white
+The network input stacks the planes of the last HISTORY positions,
+oldest first.
+
+For storage, positions are packed into POSITION_DTYPE records holding the
+board bytes, the hand counts in plane order and the player, which
+encode_packed expands back into planes.
+"""
+
+PIECE_IDS = np.arange(KING_ID, PROM_PAWN_ID + 1)
+HAND_PIECES = range(GOLD_GEN_ID, PAWN_ID + 1)
+
+PIECE_PLANES = 2 * len(PIECE_IDS)
+HAND_PLANES = 2 * len(HAND_PIECES)
+POSITION_PLANES = PIECE_PLANES + HAND_PLANES + 1
+# positions stacked in the network input
+HISTORY = 2
+INPUT_PLANES = HISTORY * POSITION_PLANES
+
+# signed piece id of every piece plane, player's pieces first
+_PLANE_PIECES = np.concatenate((PIECE_IDS, -PIECE_IDS))[:, None, None]
+
+POSITION_DTYPE = np.dtype(
+    [
+        ("board", np.int8, (BOARD_SIZE * BOARD_SIZE,)),
+        ("hands", np.uint8, (len(HAND_PIECES) * 2,)),
+        ("player", np.int8),
+    ]
+)
+
+
+def encode_position(
+    board: NDArray, player: int, captured_pieces: dict, out: NDArray = None
+) -> NDArray:
+    """
+    Writes the planes of a position in one vectorized pass
+
+    Args:
+        board (NDArray): 2D board oriented towards player
+        player (int): player to move
+        captured_pieces (dict): hands of both players
+        out (NDArray, optional): (POSITION_PLANES, 9, 9) buffer to write to
+
+    Returns:
+        NDArray: float32 planes of the position
+    """
+    if out is None:
+        out = np.empty((POSITION_PLANES, BOARD_SIZE, BOARD_SIZE), dtype=np.float32)
+    # one-hot by piece id through broadcasting against every plane's id
+    np.equal(board, player * _PLANE_PIECES, out=out[:PIECE_PLANES], casting="unsafe")
+    hands = [captured_pieces[player], captured_pieces[-player]]
+    counts = [hand[piece] for hand in hands for piece in HAND_PIECES]
+    out[PIECE_PLANES:-1] = np.array(counts)[:, None, None]
+    out[-1] = (player + 1) / 2
+    return out
+
+
+def encode_games(games: List, out: NDArray = None) -> NDArray:
+    """
+    Encodes the network input of several games at once
+
+    Args:
+        games (list[ShogiGame]): games to encode
+        out (NDArray, optional): (N, INPUT_PLANES, 9, 9) buffer to write to
+
+    Returns:
+        NDArray: float32 input planes of every game
+    """
+    if out is None:
+        shape = (len(games), INPUT_PLANES, BOARD_SIZE, BOARD_SIZE)
+        out = np.empty(shape, dtype=np.float32)
+    for game, planes in zip(games, out):
+        game.encode(planes)
+    return out
+
+
+def pack_position(
+    board: NDArray, player: int, captured_pieces: dict, out: NDArray = None
+) -> NDArray:
+    """
+    Packs a position into a POSITION_DTYPE record
+
+    Args:
+        board (NDArray): 2D board oriented towards player
+        player (int): player to move
+        captured_pieces (dict): hands of both players
+        out (NDArray, optional): record to write to
+
+    Returns:
+        NDArray: the packed record
+    """
+    if out is None:
+        out = np.zeros((), dtype=POSITION_DTYPE)
+    out["board"] = board.reshape(-1)
+    hands = [captured_pieces[player], captured_pieces[-player]]
+    out["hands"] = [hand[piece] for hand in hands for piece in HAND_PIECES]
+    out["player"] = player
+    return out
+
+
+def encode_packed(positions: NDArray, out: NDArray = None) -> NDArray:
+    """
+    Expands packed positions into their planes, vectorized over all of them
+
+    Args:
+        positions (NDArray): POSITION_DTYPE records of any shape
+        out (NDArray, optional): (*positions.shape, POSITION_PLANES, 9, 9)
+            buffer to write to
+
+    Returns:
+        NDArray: float32 planes of every position
+    """
+    shape = positions.shape
+    if out is None:
+        out = np.empty(
+            shape + (POSITION_PLANES, BOARD_SIZE, BOARD_SIZE), dtype=np.float32
+        )
+    positions = positions.reshape(-1)
+    planes = out.reshape(-1, POSITION_PLANES, BOARD_SIZE, BOARD_SIZE)
+    players = positions["player"].astype(np.int16)[:, None, None, None]
+    boards = positions["board"].reshape(-1, 1, BOARD_SIZE, BOARD_SIZE)
+    np.equal(
+        boards, players * _PLANE_PIECES, out=planes[:, :PIECE_PLANES], casting="unsafe"
+    )
+    planes[:, PIECE_PLANES:-1] = positions["hands"][:, :, None, None]
+    planes[:, -1] = (players[:, 0] + 1) / 2
+    return out
@@ -1,5 +1,19 @@
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from typing import List
 from shogi_logic import Move
-from variables import BOARD_SIZE
+from variables import ACTION_SIZE, BOARD_SIZE, PAWN_ID
+
+"""
+Conversion between moves and the action indices of the policy. The
+arithmetic codec (_encode and _decode) is only run once at import to
+build lookup tables, so every later conversion is an array lookup and
+whole lists of moves can be converted with one numpy indexing operation.
+
+Moves are packed into integer keys (from, to, promote) with squares
+numbered rank * BOARD_SIZE + file. Like in the bitboard move generator,
+drops use the negative piece id as the from square.
+"""
 
 # possible number of moves starting from each square
 PLANE_SIZE = 139
@@ -25,7 +39,7 @@ NE_OFFSET = 48
 N_OFFSET = 56
 
 
-def move_to_action(move: Move):
+def _encode(move: Move) -> int:
     offset = PLANE_SIZE * (BOARD_SIZE * move.piece[0] + move.piece[1])
     # handles drop moves
     if move.piece[0] == -1:
@@ -37,11 +51,12 @@ def move_to_action(move: Move):
         # handles knight moves
         if x_diff == -2 and (y_diff + 1) % 2 == 0:
             offset += (
-                KNIGHT_OFFSET + (y_diff + 1) / 2 + move.promote * KNIGHT_PROM_OFFSET
+                KNIGHT_OFFSET + (y_diff + 1) // 2 + move.promote * KNIGHT_PROM_OFFSET
             )
         # queen moves
         else:
-            offset += QUEEN_OFFSET + move.promote * QUEEN_PROM_OFFSET
+            # distances 1 to 8 are stored in the 8 slots of each direction
+            offset += QUEEN_OFFSET + move.promote * QUEEN_PROM_OFFSET - 1
             if x_diff == 0:
                 if y_diff < 0:
                     offset += W_OFFSET + -y_diff
@@ -64,7 +79,7 @@ def move_to_action(move: Move):
     return offset
 
 
-def action_to_move(a):
+def _decode(a: int) -> Move:
     # for each square in a row, there are PLANE_SIZE possible moves
     row_offset = PLANE_SIZE * BOARD_SIZE
 
@@ -88,7 +103,7 @@ def action_to_move(a):
         offset -= QUEEN_OFFSET
         prom = offset >= QUEEN_PROM_OFFSET
         offset %= QUEEN_PROM_OFFSET
-        dist = offset % 8
+        dist = offset % 8 + 1
         if offset >= N_OFFSET:
             dest = (start_x - dist, start_y)
         elif offset >= NE_OFFSET:
@@ -110,3 +125,126 @@ def action_to_move(a):
         dest = (start_x - 2, start_y + (offset % 2 * 2 - 1))
         prom = offset >= KNIGHT_PROM_OFFSET
     return Move((start_x, start_y), dest, prom)
+
+
+BOARD_SQUARES = BOARD_SIZE * BOARD_SIZE
+# drops are packed after the board squares, one from index per piece id
+FROM_SIZE = BOARD_SQUARES + PAWN_ID + 1
+
+
+def pack_moves(from_sq: ArrayLike, to_sq: ArrayLike, promote: ArrayLike) -> NDArray:
+    """
+    Packs moves into keys of MOVE_TO_ACTION
+
+    Args:
+        from_sq (ArrayLike): start squares, negative piece ids for drops
+        to_sq (ArrayLike): destination squares
+        promote (ArrayLike): whether the moves promote
+
+    Returns:
+        NDArray: keys of the moves
+    """
+    from_sq = np.asarray(from_sq)
+    from_index = np.where(from_sq < 0, BOARD_SQUARES - from_sq, from_sq)
+    return (from_index * BOARD_SQUARES + to_sq) * 2 + np.asarray(promote, dtype=int)
+
+
+def _move_key(move: Move) -> int:
+    rank, file = move.piece
+    from_index = BOARD_SQUARES + file if rank == -1 else rank * BOARD_SIZE + file
+    to_sq = move.dest[0] * BOARD_SIZE + move.dest[1]
+    return (from_index * BOARD_SQUARES + to_sq) * 2 + move.promote
+
+
+def _on_board(square: tuple) -> bool:
+    return 0 <= square[0] < BOARD_SIZE and 0 <= square[1] < BOARD_SIZE
+
+
+# decoded move of every action
+ACTION_MOVES = [_decode(a) for a in range(ACTION_SIZE)]
+# the same moves as arrays, with -1 destinations for moves off the board
+ACTION_FROM_SQ = np.array(
+    [
+        (
+            -move.piece[1]
+            if move.piece[0] == -1
+            else move.piece[0] * BOARD_SIZE + move.piece[1]
+        )
+        for move in ACTION_MOVES
+    ]
+)
+ACTION_TO_SQ = np.array(
+    [
+        move.dest[0] * BOARD_SIZE + move.dest[1] if _on_board(move.dest) else -1
+        for move in ACTION_MOVES
+    ]
+)
+ACTION_PROMOTE = np.array([move.promote for move in ACTION_MOVES])
+
+# action of every packed move key, -1 for moves without an action
+MOVE_TO_ACTION = np.full(FROM_SIZE * BOARD_SQUARES * 2, -1, dtype=np.int32)
+for _action, _move in enumerate(ACTION_MOVES):
+    if _on_board(_move.dest):
+        MOVE_TO_ACTION[_move_key(_move)] = _action
+# python list copy, since indexing numpy arrays with scalars is slow
+_MOVE_TO_ACTION = MOVE_TO_ACTION.tolist()
+
+
+def move_to_action(move: Move) -> int:
+    """
+    Gets the action index of a move
+
+    Args:
+        move (Move): move in the current player's perspective
+
+    Returns:
+        int: index in the policy vector
+    """
+    rank, file = move.dest
+    if 0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE:
+        return _MOVE_TO_ACTION[_move_key(move)]
+    # actions decoded to squares off the board still round trip
+    return _encode(move)
+
+
+def action_to_move(a: int) -> Move:
+    return ACTION_MOVES[a]
+
+
+def moves_to_actions(moves: List[Move]) -> NDArray:
+    """
+    Gets the action indices of a list of moves on the board
+
+    Args:
+        moves (list[Move]): moves in the current player's perspective
+
+    Returns:
+        NDArray: action index of every move
+    """
+    keys = np.fromiter((_move_key(move) for move in moves), dtype=int, count=len(moves))
+    return MOVE_TO_ACTION[keys]
+
+
+def squares_to_actions(
+    from_sq: ArrayLike, to_sq: ArrayLike, promote: ArrayLike
+) -> NDArray:
+    # vectorized move_to_action for moves given as square arrays
+    return MOVE_TO_ACTION[pack_moves(from_sq, to_sq, promote)]
+
+
+def actions_to_moves(actions: ArrayLike) -> List[Move]:
+    return [ACTION_MOVES[a] for a in np.asarray(actions).tolist()]
+
+
+def actions_to_squares(actions: ArrayLike) -> tuple:
+    """
+    Decodes actions into arrays of from squares, to squares and promotions
+
+    Args:
+        actions (ArrayLike): action indices
+
+    Returns:
+        tuple: from_sq, to_sq and promote arrays, see pack_moves
+    """
+    actions = np.asarray(actions)
+    return ACTION_FROM_SQ[actions], ACTION_TO_SQ[actions], ACTION_PROMOTE[actions]
@@ -0,0 +1,188 @@
+import argparse
+from time import perf_counter
+from typing import Callable, Dict
+from shogi_game import ShogiGame, MOVE_GENERATORS
+from usi import fen_to_game, move_to_usi
+from variables import MOVE_GENERATOR
+
+"""
+Perft (performance test) counts the leaf nodes of the move tree up to a
+given depth, walking it in place with ShogiGame.push/pop. Comparing the
+counts with known values catches move generation bugs, and timing them
+compares the speed of the generators.
+
+Usage:
+    python perft.py --depth 3
+    python perft.py --position matsuri --depth 2 --divide --engine bitboard
+    python perft.py --sfen "<sfen>" --depth 2
+    python perft.py --check --depth 2
+"""
+
+START_SFEN = "lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL b - 1"
+
+# reference node counts where index i holds perft(i + 1)
+PERFT_POSITIONS = {
+    "startpos": (START_SFEN, [30, 900, 25470, 719731]),
+    # many captures, promotions and drops for both sides
+    "matsuri": (
+        "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1",
+        [207, 28684, 4809015],
+    ),
+    # position with the most legal moves known
+    "max_moves": (
+        "R8/2K1S1SSk/4B4/9/9/9/9/9/1L1L1L3 b RBGSNLP3g3n17p 1",
+        [593, 105677],
+    ),
+    # side to move is in check and only has three evasions
+    "evasions": (
+        "lr5nl/2Skg1g2/2P1p2pp/p1ps1Np2/1p3p3/P1s1PPP2/1P4S1P/3+p3R1/LNK4NL b BPb2gp 61",
+        [3, 430, 38436],
+    ),
+    # gold pinned by a rook, silver pinned by a bishop and pawn drops
+    "pins": ("4k4/9/4r4/2b6/4G4/9/2S6/9/4K4 b GPp 1", [154, 14312, 1267511]),
+    # opening with exchanged bishops in hand
+    "bishop_exchange": (
+        "ln1g3nl/1r1sk1g2/p1pp1s1pp/4p1p2/1p5P1/2P1P4/PPSP1PP1P/2G2S1R1/LN2KG1NL b Bb 1",
+        [74, 5340, 274373],
+    ),
+}
+
+
+def perft(game: ShogiGame, depth: int, get_moves: Callable) -> int:
+    """
+    Counts the leaf nodes of the move tree
+
+    Args:
+        game (ShogiGame): root position
+        depth (int): number of plies to search
+        get_moves (Callable): move generator with the shogi_logic.get_moves
+            contract
+
+    Returns:
+        int: number of leaf nodes
+    """
+    if depth == 0:
+        return 1
+    player = game.current_player
+    moves = get_moves(game.board, player, game.captured_pieces[player])
+    # leaf nodes don't need to be played out
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.push(move)
+        nodes += perft(game, depth - 1, get_moves)
+        game.pop()
+    return nodes
+
+
+def divide(game: ShogiGame, depth: int, get_moves: Callable) -> Dict[str, int]:
+    """
+    Counts the leaf nodes below every root move
+
+    Args:
+        game (ShogiGame): root position
+        depth (int): number of plies to search, including the root move
+        get_moves (Callable): move generator
+
+    Returns:
+        dict[str, int]: node counts keyed by the root move in USI notation
+    """
+    player = game.current_player
+    moves = get_moves(game.board, player, game.captured_pieces[player])
+    counts = {}
+    for move in moves:
+        game.push(move)
+        counts[move_to_usi(move, player)] = perft(game, depth - 1, get_moves)
+        game.pop()
+    return counts
+
+
+def run_perft(sfen: str, depth: int, engine: str, show_divide=False) -> int:
+    """
+    Runs perft on a position, printing the node count and speed
+
+    Args:
+        sfen (str): position in SFEN notation
+        depth (int): number of plies to search
+        engine (str): key into MOVE_GENERATORS
+        show_divide (bool, optional): print counts per root move
+
+    Returns:
+        int: number of leaf nodes
+    """
+    game = fen_to_game(sfen)
+    get_moves = MOVE_GENERATORS[engine]
+    start = perf_counter()
+    if show_divide:
+        counts = divide(game, depth, get_moves)
+        for move, count in sorted(counts.items()):
+            print(f"{move}: {count}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(game, depth, get_moves)
+    elapsed = perf_counter() - start
+    print(
+        f"depth {depth}: {nodes} nodes in {elapsed:.3f}s "
+        f"({nodes / max(elapsed, 1e-9):.0f} nodes/sec, {engine})"
+    )
+    return nodes
+
+
+def check_positions(max_depth: int, engine: str) -> bool:
+    """
+    Compares perft results with the reference counts
+
+    Args:
+        max_depth (int): deepest depth to check
+        engine (str): key into MOVE_GENERATORS
+
+    Returns:
+        bool: whether every count matched
+    """
+    passed = True
+    for name, (sfen, counts) in PERFT_POSITIONS.items():
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            print(name, end=" ")
+            nodes = run_perft(sfen, depth, engine)
+            if nodes != expected:
+                print(f"MISMATCH: expected {expected}")
+                passed = False
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move generator perft")
+    position = parser.add_mutually_exclusive_group()
+    position.add_argument("--sfen", help="position to search")
+    position.add_argument(
+        "--position",
+        choices=PERFT_POSITIONS.keys(),
+        default="startpos",
+        help="reference position to search",
+    )
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument(
+        "--engine", choices=MOVE_GENERATORS.keys(), default=MOVE_GENERATOR
+    )
+    parser.add_argument(
+        "--divide", action="store_true", help="print counts per root move"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="compare every reference position up to depth with known counts",
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        if not check_positions(args.depth, args.engine):
+            raise SystemExit(1)
+        return
+
+    sfen = args.sfen or PERFT_POSITIONS[args.position][0]
+    run_perft(sfen, args.depth, args.engine, args.divide)
+
+
+if __name__ == "__main__":
+    main()
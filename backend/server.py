@@ -1,22 +1,46 @@
 import random
-from flask import Flask
+import sys
+from flask import Flask, request
 from flask_socketio import SocketIO, emit
 from shogi_logic import (
     Move,
     find_moves_for_piece,
     move_to_board,
-    rotate_board,
-    check_check,
+    rotate_move,
+    in_check,
     get_moves,
     find_drops_for_piece,
 )
 import numpy as np
+from shogi_game import ShogiGame
+from move_conversion import action_to_move
+from variables import (
+    MODEL_CHECKPOINT,
+    MODEL_LAYERS,
+    MODEL_SIMULATIONS,
+    MODEL_MEMORY_MB,
+    INFERENCE_MAX_BATCH_SIZE,
+    INFERENCE_MAX_LATENCY,
+)
+
+sys.path.append("./alpha_zero")
+from mcts_iter import MCTS
+from inference_server import InferenceServer
+from model import ResCNN, load_checkpoint
 
 # add secret key later
 app = Flask(__name__)
 app.config["DEBUG"] = True
 # should change allowed origins later
-socketio = SocketIO(app, cors_allowed_origins="*")
+# handlers wait on the inference process, so they run in real threads to
+# let concurrent games share its batches
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+
+# evaluates positions for every game, started with the server if there is
+# a model checkpoint
+inference = None
+# search tree of every connected game, reused between the model's moves
+searches = {}
 
 
 @socketio.on("connect")
@@ -46,7 +70,7 @@ def send_moves(data):
     moves = [
         move
         for move in moves
-        if not check_check(rotate_board(move_to_board(board, player, move)), player)
+        if not in_check(move_to_board(board, player, move), player)
     ]
 
     # translates Move object into array
@@ -56,45 +80,88 @@ def send_moves(data):
 
 @socketio.on("get move")
 def model_move(data):
-    model_captured_dict = process_dict(data["model_captured_dict"])
-    board = rotate_board(np.array(data["board"]))
     player = data["color"]
-    moves = get_moves(
-        board,
-        player,
-        model_captured_dict,
+    captured_pieces = {
+        player: process_dict(data["model_captured_dict"]),
+        -player: process_dict(data["player_captured_dict"]),
+    }
+    # the frontend sends the board oriented towards the player, which the
+    # game keeps as its other board
+    game = ShogiGame(
+        captured_pieces, None, player, rotated_board=np.array(data["board"])
     )
+    moves = get_moves(game.board, player, captured_pieces[player])
 
     # sends lost signal for model player
     if len(moves) == 0:
         emit("model lost")
         return
 
-    # randomly sample move
-    # replace this with actual model later
-    move = random.choice(moves)
+    if inference is None:
+        # randomly sample move
+        move = random.choice(moves)
+        game.push(move)
+    else:
+        move = search_move(game)
 
-    new_board = rotate_board(move_to_board(board, player, move))
-    player_captured_dict = process_dict(data["player_captured_dict"])
-    player_moves = get_moves(new_board, -player, player_captured_dict)
+    # after the move the game's board is oriented towards the player
+    player_moves = get_moves(game.board, -player, captured_pieces[-player])
     if len(player_moves) == 0:
         emit("player lost")
         return
 
-    new_start = move.piece
-    if move.piece[0] != -1:
-        new_start = (8 - move.piece[0], 8 - move.piece[1])
-    new_dest = (8 - move.dest[0], 8 - move.dest[1])
-    move = move_to_arr(Move(new_start, new_dest, move.promote))
+    move = move_to_arr(rotate_move(move))
     print(move)
 
     emit("model move", move)
 
 
+def search_move(game: ShogiGame) -> Move:
+    """
+    Searches the model's move and executes it on game
+
+    Args:
+        game (ShogiGame): position with the model to move
+
+    Returns:
+        Move: move oriented towards the model
+    """
+    mcts = searches.get(request.sid)
+    if mcts is None:
+        mcts = searches[request.sid] = MCTS(
+            None, max_memory_mb=MODEL_MEMORY_MB, batch_size=8, evaluator=inference
+        )
+    else:
+        # the player's reply was usually explored by the last search
+        mcts.advance(game)
+    mcts.simulate(game, MODEL_SIMULATIONS, reuse=True)
+    actions, probs = mcts.getSparsePolicy(game)
+    move = action_to_move(int(actions[np.argmax(probs)]))
+    # only the subtree of the chosen move is kept for the next search
+    game.push(move)
+    mcts.advance(game)
+    return move
+
+
+@socketio.on("inference stats")
+def send_inference_stats():
+    emit("inference stats", inference.stats() if inference else {})
+
+
 @socketio.on("disconnect")
 def client_disconnect():
+    mcts = searches.pop(request.sid, None)
+    if mcts is not None:
+        mcts.close()
     print("Connection closed")
 
 
 if __name__ == "__main__":
+    if MODEL_CHECKPOINT:
+        nnet = ResCNN(MODEL_LAYERS)
+        load_checkpoint(nnet, MODEL_CHECKPOINT)
+        inference = InferenceServer(
+            nnet, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_LATENCY
+        )
+        inference.start()
     socketio.run(app, host="0.0.0.0")
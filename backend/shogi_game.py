@@ -1,4 +1,5 @@
 from __future__ import annotations
+from collections import OrderedDict
 import torch
 from variables import (
     BLACK,
@@ -6,26 +7,73 @@ from variables import (
     WHITE,
     DEFAULT_BOARD,
     ACTION_SIZE,
-    KING_ID,
-    PROM_PAWN_ID,
-    GOLD_GEN_ID,
-    PAWN_ID,
+    EMPTY_SQUARE_ID,
+    PROMOTE_CONSTANT,
+    BOARD_SIZE,
+    MOVE_GENERATOR,
 )
 import numpy as np
-from shogi_logic import get_moves, move_to_board, rotate_board
-from move_conversion import move_to_action, action_to_move
+import bitboard
+import shogi_logic
+from shogi_logic import Move, rotate_board, unpromote
+from move_conversion import move_to_action, action_to_move, moves_to_actions
+from encoding import encode_position, HISTORY, POSITION_PLANES
+from zobrist import compute_key, square_key, hand_key, WHITE_TO_MOVE_KEY
 from numpy.typing import NDArray
 
+# move generators that can be selected with MOVE_GENERATOR
+MOVE_GENERATORS = {"array": shogi_logic.get_moves, "bitboard": bitboard.get_moves}
+get_moves = MOVE_GENERATORS[MOVE_GENERATOR]
+
+# index of the last rank/file, used to mirror squares onto the rotated board
+LAST_INDEX = BOARD_SIZE - 1
+
+# positions whose planes are cached, about 14 KB each
+PLANE_CACHE_SIZE = 64
+# positions whose legal actions are cached, about 1 KB each
+MOVE_CACHE_SIZE = 4096
+
+
+def _cache_get(cache: OrderedDict, key: int):
+    value = cache.get(key)
+    if value is not None:
+        try:
+            cache.move_to_end(key)
+        except KeyError:
+            # evicted meanwhile by a search thread sharing the cache
+            pass
+    return value
+
+
+def _cache_put(cache: OrderedDict, key: int, value, size: int):
+    cache[key] = value
+    if len(cache) > size:
+        try:
+            cache.popitem(last=False)
+        except KeyError:
+            # emptied meanwhile by a search thread sharing the cache
+            pass
+
 
 class ShogiGame:
     def __init__(
         self,
-        captured_pieces={BLACK: dict(CAPTURED_DICT), WHITE: dict(CAPTURED_DICT)},
-        board=np.array(DEFAULT_BOARD),
+        captured_pieces=None,
+        board=None,
         current_player=BLACK,
         prev_state=None,
+        rotated_board=None,
     ):
         # initializing captured pieces
+        if captured_pieces is None:
+            captured_pieces = {BLACK: dict(CAPTURED_DICT), WHITE: dict(CAPTURED_DICT)}
+        if board is None:
+            if rotated_board is None:
+                board = np.array(DEFAULT_BOARD)
+            else:
+                board = np.copy(rotate_board(rotated_board))
+        if rotated_board is None:
+            rotated_board = np.copy(rotate_board(board))
         self.captured_pieces = captured_pieces
         self.board = board
         self.current_player = current_player
@@ -33,6 +81,94 @@ class ShogiGame:
         if not prev_state:
             self.prev_state = self
 
+        # board oriented towards the other player, kept in sync by push/pop
+        # (and passed along by copy) so that the board never has to be rotated
+        self._rotated_board = rotated_board
+        # (move, captured piece, zobrist key) for every move executed with push
+        self._undo_stack = []
+        # computed lazily, then updated incrementally by push/pop
+        self._zobrist_key = None
+        # planes of recently encoded positions keyed by zobrist key, shared
+        # with copies since they usually revisit the same positions
+        self._plane_cache = OrderedDict()
+        # legal actions of recently visited positions keyed by zobrist key,
+        # shared with copies like the planes
+        self._move_cache = OrderedDict()
+        # legal actions and valid move vector of the position, computed at
+        # most once and cleared by push/pop
+        self._actions = None
+        self._valids = None
+
+    @property
+    def zobrist_key(self) -> int:
+        """
+        64 bit zobrist key of the position (board, hands and player to
+        move). It is computed once and then updated in O(1) per move, so
+        assigning to board or captured_pieces directly isn't tracked.
+
+        Returns:
+            int: zobrist key
+        """
+        if self._zobrist_key is None:
+            self._zobrist_key = compute_key(
+                self.board, self.current_player, self.captured_pieces
+            )
+        return self._zobrist_key
+
+    @property
+    def fixed_board(self) -> NDArray:
+        """
+        Board oriented towards black whichever player is to move, as used
+        by SFEN and the frontend. It is one of the two boards kept by
+        push/pop, so getting it doesn't rotate or copy anything.
+
+        Returns:
+            NDArray: board from black's perspective, shared with the game
+        """
+        return self.board if self.current_player == BLACK else self._rotated_board
+
+    @classmethod
+    def from_fixed_board(
+        cls, captured_pieces: dict, board: NDArray, current_player: int
+    ) -> ShogiGame:
+        """
+        Creates a game from a board oriented towards black
+
+        Args:
+            captured_pieces (dict): hands of both players
+            board (NDArray): board from black's perspective, used as is
+            current_player (int): player to move
+
+        Returns:
+            ShogiGame: the position
+        """
+        if current_player == BLACK:
+            return cls(captured_pieces, board, current_player)
+        return cls(captured_pieces, None, current_player, rotated_board=board)
+
+    def legal_actions(self) -> NDArray:
+        """
+        Gets the action ids of the legal moves. They are generated at most
+        once per position: the result is kept until the next push/pop and
+        in a cache keyed by zobrist key that is shared with copies, so like
+        the key it doesn't track direct assignments to board or
+        captured_pieces.
+
+        Returns:
+            NDArray: read only action ids, shared with the cache
+        """
+        if self._actions is None:
+            key = self.zobrist_key
+            actions = _cache_get(self._move_cache, key)
+            if actions is None:
+                player = self.current_player
+                moves = get_moves(self.board, player, self.captured_pieces[player])
+                actions = moves_to_actions(moves)
+                actions.flags.writeable = False
+                _cache_put(self._move_cache, key, actions, MOVE_CACHE_SIZE)
+            self._actions = actions
+        return self._actions
+
     def getGameEnded(self) -> bool:
         """
         Returns current status of game (in play, draw, loss)
@@ -41,8 +177,7 @@ class ShogiGame:
             bool: currently returns whether game has been lost or not
         """
         # need to also check for draws - don't understand draw rules yet though
-        player = self.current_player
-        return len(get_moves(self.board, player, self.captured_pieces[player])) == 0
+        return len(self.legal_actions()) == 0
 
     def getValidMoves(self) -> NDArray:
         """
@@ -55,21 +190,17 @@ class ShogiGame:
         Total offset = Starting square offset + Move offset
 
         Returns:
-            NDArray: one-hot vector wit valid moves
+            NDArray: read only one-hot vector with valid moves, computed
+                once per position
         """
-        player = self.current_player
-        # current player perspective
-        moves = get_moves(self.board, player, self.captured_pieces[player])
-
-        # lots of constants to save from this logic
-        valids = np.zeros(ACTION_SIZE)
-
-        # this all assumes that the board is from the perspective of the
-        # current player
-        for move in moves:
-            offset = move_to_action(move)
-            valids[int(offset)] = 1
-        return valids
+        if self._valids is None:
+            valids = np.zeros(ACTION_SIZE)
+            # this all assumes that the board is from the perspective of the
+            # current player
+            valids[self.legal_actions()] = 1
+            valids.flags.writeable = False
+            self._valids = valids
+        return self._valids
 
     # assuming that a is from perspective of current player
     # also assumes valid move
@@ -84,51 +215,212 @@ class ShogiGame:
         Returns:
             ShogiGame: state of game after move a
         """
-        move = action_to_move(a)
-        self.captured_pieces[self.current_player][move.piece[1]] -= 1
-        if self.captured_pieces[self.current_player][move.piece[1]] < 0:
-            raise ValueError("Invalid drop move.")
-        # executes move
-        new_board = move_to_board(self.board, self.current_player, move)
-        return ShogiGame(
-            self.captured_pieces, rotate_board(new_board), -self.current_player
+        game = self.copy()
+        game.push(action_to_move(a))
+        # history is kept through prev_state for immutable states
+        game._undo_stack.clear()
+        game.prev_state = self
+        return game
+
+    def copy(self) -> ShogiGame:
+        """
+        Copies the current position, without its undo history
+
+        Returns:
+            ShogiGame: independent copy of the game
+        """
+        captured_pieces = {
+            BLACK: dict(self.captured_pieces[BLACK]),
+            WHITE: dict(self.captured_pieces[WHITE]),
+        }
+        game = ShogiGame(
+            captured_pieces,
+            np.copy(self.board),
+            self.current_player,
+            self.prev_state,
+            np.copy(self._rotated_board),
         )
+        game._zobrist_key = self._zobrist_key
+        game._plane_cache = self._plane_cache
+        game._move_cache = self._move_cache
+        game._actions = self._actions
+        game._valids = self._valids
+        return game
+
+    def push(self, move: Move):
+        """
+        Executes move in place. The board, hands and player to move are
+        updated without allocating a new board, and the move can be undone
+        with pop.
+
+        Args:
+            move (Move): move from the perspective of the current player
+        """
+        player = self.current_player
+        board = self.board
+        rotated = self._rotated_board
+        hand = self.captured_pieces[player]
+        rank, file = move.piece
+        new_rank, new_file = move.dest
+        captured = board[new_rank][new_file]
+        key = self._zobrist_key
+        update_key = key is not None
+
+        if rank == -1:
+            # removes dropped piece from hand
+            count = hand[file]
+            if count <= 0:
+                raise ValueError("Invalid drop move.")
+            hand[file] = count - 1
+            piece = file * player
+            if update_key:
+                key ^= hand_key(player, file, count) ^ hand_key(player, file, count - 1)
+        else:
+            piece = board[rank][file]
+            if update_key:
+                key ^= square_key(rank, file, piece, player)
+            if move.promote:
+                piece += PROMOTE_CONSTANT * player
+            board[rank][file] = EMPTY_SQUARE_ID
+            rotated[LAST_INDEX - rank][LAST_INDEX - file] = EMPTY_SQUARE_ID
+            # adds captured piece to hand
+            if captured != EMPTY_SQUARE_ID:
+                captured_id = unpromote(captured)
+                count = hand[captured_id]
+                hand[captured_id] = count + 1
+                if update_key:
+                    key ^= square_key(new_rank, new_file, captured, player)
+                    key ^= hand_key(player, captured_id, count)
+                    key ^= hand_key(player, captured_id, count + 1)
+        board[new_rank][new_file] = piece
+        rotated[LAST_INDEX - new_rank][LAST_INDEX - new_file] = piece
+
+        self._undo_stack.append((move, captured, self._zobrist_key))
+        if update_key:
+            self._zobrist_key = (
+                key ^ square_key(new_rank, new_file, piece, player) ^ WHITE_TO_MOVE_KEY
+            )
+        # the rotated board is oriented towards the next player
+        self.board, self._rotated_board = rotated, board
+        self.current_player = -player
+        self._actions = self._valids = None
+
+    def pop(self) -> Move:
+        """
+        Undoes the last move executed with push
+
+        Returns:
+            Move: the undone move
+        """
+        move, captured, self._zobrist_key = self._undo_stack.pop()
+        player = -self.current_player
+        board, rotated = self._rotated_board, self.board
+        hand = self.captured_pieces[player]
+        rank, file = move.piece
+        new_rank, new_file = move.dest
+        piece = board[new_rank][new_file]
+
+        if rank == -1:
+            hand[file] += 1
+        else:
+            if move.promote:
+                piece -= PROMOTE_CONSTANT * player
+            board[rank][file] = piece
+            rotated[LAST_INDEX - rank][LAST_INDEX - file] = piece
+            if captured != EMPTY_SQUARE_ID:
+                hand[unpromote(captured)] -= 1
+        board[new_rank][new_file] = captured
+        rotated[LAST_INDEX - new_rank][LAST_INDEX - new_file] = captured
+
+        self.board, self._rotated_board = board, rotated
+        self.current_player = player
+        self._actions = self._valids = None
+        return move
 
     # maybe find better alternative
     def toString(self):
-        data = dict(self.__dict__)
-        del data["prev_state"]
+        data = {
+            "captured_pieces": self.captured_pieces,
+            "board": self.board,
+            "current_player": self.current_player,
+        }
         return str(data)
 
-    def toTensor(self):
-        layers = []
-        piece_iter = range(KING_ID, PROM_PAWN_ID + 1)
-        prev = self.prev_state
-        self._toTensor(
-            piece_iter, layers, prev.board, prev.current_player, prev.captured_pieces
-        )
-        board = self.board
-        player = self.current_player
-        caps = self.captured_pieces
-        self._toTensor(piece_iter, layers, board, player, caps)
-        return torch.stack(layers)
+    def toTensor(self, out: NDArray = None, history=HISTORY) -> torch.Tensor:
+        """
+        Encodes the last history positions into the network input
 
-    def _toTensor(
-        self,
-        piece_iter: range,
-        layers: list,
-        board: NDArray,
-        player: int,
-        captured_pieces: dict,
-    ):
-        for piece in piece_iter:
-            layers.append(torch.from_numpy(np.where(board == player * piece, 1, 0)))
-        for piece in piece_iter:
-            layers.append(torch.from_numpy(np.where(board == -player * piece, 1, 0)))
-        caps = captured_pieces[player]
-        for piece in range(GOLD_GEN_ID, PAWN_ID + 1):
-            layers.append(torch.full((9, 9), caps[piece]))
-        caps = captured_pieces[-player]
-        for piece in range(GOLD_GEN_ID, PAWN_ID + 1):
-            layers.append(torch.full((9, 9), caps[piece]))
-        layers.append(torch.full((9, 9), (player + 1) / 2))
+        Args:
+            out (NDArray, optional): see encode
+            history (int, optional): see encode
+
+        Returns:
+            torch.Tensor: (history * POSITION_PLANES, 9, 9) float32 tensor
+        """
+        return torch.from_numpy(self.encode(out, history))
+
+    def encode(self, out: NDArray = None, history=HISTORY) -> NDArray:
+        """
+        Writes the planes of the last history positions, oldest first. The
+        planes of every position are cached, so each position is only
+        encoded once and stacking the history is a copy per position.
+
+        Args:
+            out (NDArray, optional): (history * POSITION_PLANES, 9, 9)
+                float32 buffer to write to, allocated if not given
+            history (int, optional): number of positions to stack
+
+        Returns:
+            NDArray: the written planes
+        """
+        if out is None:
+            shape = (history * POSITION_PLANES, BOARD_SIZE, BOARD_SIZE)
+            out = np.empty(shape, dtype=np.float32)
+        blocks = out.reshape(history, POSITION_PLANES, BOARD_SIZE, BOARD_SIZE)
+        stack = self._undo_stack
+        # ply of the position being encoded within the undo stack
+        depth = len(stack)
+        game = self
+        popped = []
+        for block in blocks[::-1]:
+            if game is self:
+                # keys of earlier positions are kept in the undo stack
+                key = stack[depth][2] if depth < len(stack) else self.zobrist_key
+                planes = self._cached_planes(key)
+                if planes is None:
+                    # positions missing from the cache are reached with pop
+                    while len(stack) > depth:
+                        popped.append(self.pop())
+                    planes = self._position_planes()
+                if depth:
+                    depth -= 1
+                else:
+                    game = self.prev_state
+            else:
+                planes = game._position_planes()
+                game = game.prev_state
+            block[...] = planes
+        for move in reversed(popped):
+            self.push(move)
+        return out
+
+    def _cached_planes(self, key: int) -> NDArray:
+        return _cache_get(self._plane_cache, key)
+
+    def _position_planes(self) -> NDArray:
+        """
+        Gets the planes of the current position, encoding them on a cache
+        miss. The cache is keyed by zobrist key, so like the key it doesn't
+        track direct assignments to board or captured_pieces.
+
+        Returns:
+            NDArray: (POSITION_PLANES, 9, 9) planes, shared with the cache
+        """
+        key = self.zobrist_key
+        planes = self._cached_planes(key)
+        if planes is None:
+            planes = encode_position(
+                self.board, self.current_player, self.captured_pieces
+            )
+            _cache_put(self._plane_cache, key, planes, PLANE_CACHE_SIZE)
+        return planes
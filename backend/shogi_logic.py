@@ -4,6 +4,7 @@ from variables import *
 import numpy as np
 from numpy.typing import NDArray
 
+
 # Used to represent a move
 # by convention, drops are represented with piece tuple being in
 # the format (-1, piece id)
@@ -24,8 +25,17 @@ List of methods in this file:
 
 check_owned(piece, player): Checks whether piece belongs to player
 rotate_board(board): Orients board towards other player
+rotate_move(move): Orients move towards other player
+unpromote(piece): Gets the unsigned, unpromoted id of a piece
 move_to_board(board, player, move): Adds move to copy of board and returns it
 get_moves(board, player, cap_pieces): Gets all moves a player can do
+find_checks_and_pins(board, player, king): Finds pieces checking player's
+    king and player's pieces pinned to it
+attackers_to_square(board, player, square): Walks outwards from square to
+    find the enemy pieces attacking it
+in_check(board, player): Checks if player's king is attacked
+is_legal_move(board, player, move, king, checkers, evasions, pins): Checks
+    that a move doesn't leave player's king in check
 force_promote(piece, rank): Checks if piece is required to promote
 iterate_direction(board, player, rank, file, move, prom): Adds moves for pieces
     that can move multiple tiles in a direction
@@ -33,13 +43,12 @@ get_piece_moves(board, player, rank, file, move_set, prom): Given the piece's
     move set and whether it can promote, create moves
 find_moves_for_piece(board, player, rank, file): Skeleton function that
     gets moves for specific piece it encounters
-add_drops_piece(board, player, rank, file, piece, drops): For a given
-    piece and square, add a drop move to drops if piece can be dropped
-    at the square 
-add_drops(board, player, rank, file, captured_pieces): Gets drops that
-    are possible on an empty tile
+get_drops(board, player, cap_pieces): Gets the drops of every piece in
+    hand, using masks computed once per position
+pawn_drop_mates(board, player, square): Checks if dropping a pawn on square
+    checkmates the opponent (pawn drop rule)
 checkmate_check(board, player): Checks if player is in
-    checkmate (mainly for pawn drop rule)
+    checkmate, the reference for pawn_drop_mates
 iterate_direction_check(board, player, rank, file, move): For an 
     opposing piece that can move multiple squares, see if it checks 
     player's king. Board is oriented towards opposing player.
@@ -51,7 +60,49 @@ find_moves_for_piece_check(board, player, rank, file): Checks whether
     opposing player.
 check_check(board, player): For a given board, checks if player is in
     check. Board is oriented in direction of opposing player.
+scan_check(board, player): check_check by scanning every enemy piece, kept
+    as a reference for tests and benchmark_check.py
 """
+# directions each piece can move a single step in
+PIECE_STEPS = {
+    KING_ID: KING_MOVES,
+    GOLD_GEN_ID: GOLD_GEN_MOVES,
+    PROM_SILG_ID: GOLD_GEN_MOVES,
+    PROM_KNIGHT_ID: GOLD_GEN_MOVES,
+    PROM_PAWN_ID: GOLD_GEN_MOVES,
+    PROM_LANCE_ID: GOLD_GEN_MOVES,
+    SILVER_GEN_ID: SILVER_GEN_MOVES,
+    KNIGHT_ID: KNIGHT_MOVES,
+    PAWN_ID: PAWN_MOVES,
+    ROOK_ID: [],
+    BISHOP_ID: [],
+    LANCE_ID: [],
+    PROM_ROOK_ID: KING_MOVES,
+    PROM_BISH_ID: KING_MOVES,
+}
+
+# directions each sliding piece can move multiple tiles in
+PIECE_SLIDES = {
+    ROOK_ID: ROOK_MOVES,
+    PROM_ROOK_ID: ROOK_MOVES,
+    BISHOP_ID: BISHOP_MOVES,
+    PROM_BISH_ID: BISHOP_MOVES,
+    LANCE_ID: LANCE_MOVES,
+}
+
+# first rank each piece can be dropped on
+DROP_FIRST_RANK = {PAWN_ID: 1, LANCE_ID: 1, KNIGHT_ID: 2}
+
+# drop moves of every piece in hand on every square, shared between calls
+DROP_MOVES = {
+    piece: [
+        Move((-1, piece), divmod(square, BOARD_SIZE))
+        for square in range(BOARD_SIZE * BOARD_SIZE)
+    ]
+    for piece in CAPTURED_DICT
+}
+
+
 # will be used in case I change my mind later
 # actually prolly on the chopping block
 def check_owned(piece: int, player: int) -> bool:
@@ -71,6 +122,41 @@ def rotate_board(board: NDArray) -> NDArray:
     return np.flip(np.flip(board, 1), 0)
 
 
+def rotate_move(move: Move) -> Move:
+    """
+    Orients move towards other player, the square for square equivalent
+    of rotate_board. Drops keep their (-1, piece id) start.
+
+    Args:
+        move (Move): move oriented towards a player
+
+    Returns:
+        Move: the same move oriented towards the other player
+    """
+    last = BOARD_SIZE - 1
+    rank, file = move.piece
+    if rank != -1:
+        rank, file = last - rank, last - file
+    dest = (last - move.dest[0], last - move.dest[1])
+    return Move((rank, file), dest, move.promote)
+
+
+def unpromote(piece: int) -> int:
+    """
+    Gets the unsigned, unpromoted id of a piece (used when capturing)
+
+    Args:
+        piece (int): signed piece id
+
+    Returns:
+        int: id of the piece once it's added to a hand
+    """
+    piece = abs(int(piece))
+    if piece > PAWN_ID:
+        piece -= PROMOTE_CONSTANT
+    return piece
+
+
 # currently does not remove dropped piece from captured hand
 def move_to_board(board: NDArray, player: int, move: Move) -> NDArray:
     """
@@ -95,7 +181,7 @@ def move_to_board(board: NDArray, player: int, move: Move) -> NDArray:
         # otherwise, move appropriate piece to new square
         piece = board[rank][file]
         if move.promote:
-            piece += PROMOTE_CONSTANT
+            piece += PROMOTE_CONSTANT * player
         new_board[new_rank][new_file] = piece
         new_board[rank][file] = EMPTY_SQUARE_ID
     return new_board
@@ -116,20 +202,190 @@ def get_moves(board: NDArray, player: int, cap_pieces: dict) -> List[Move]:
     moves = []
     for rank, row in enumerate(board):
         for file, piece in enumerate(row):
-            if piece == EMPTY_SQUARE_ID:
-                # if empty square, player can add drops
-                moves += add_drops(board, player, rank, file, cap_pieces)
-            elif check_owned(piece, player):
+            if check_owned(piece, player):
                 # if piece owned by player, find moves for piece
                 moves += find_moves_for_piece(board, player, rank, file)
+    moves += get_drops(board, player, cap_pieces)
+
+    kings = np.argwhere(board == player * KING_ID)
+    # without a king, every move is legal
+    if len(kings) == 0:
+        return moves
+    king = tuple(int(coord) for coord in kings[0])
 
     # filter out moves that result in check on player's king
-    moves = [
+    checkers, evasions, pins = find_checks_and_pins(board, player, king)
+    return [
         move
         for move in moves
-        if not check_check(rotate_board(move_to_board(board, player, move)), player)
+        if is_legal_move(board, player, move, king, checkers, evasions, pins)
     ]
-    return moves
+
+
+def find_checks_and_pins(board: NDArray, player: int, king: tuple) -> tuple:
+    """
+    Walks outwards from player's king to find the enemy pieces checking it
+    and the player's pieces pinned to it
+
+    Args:
+        board (NDArray): 2D representation of board
+        player (int): current player
+        king (tuple): rank and file of player's king
+
+    Returns:
+        tuple: list of checking squares, set of squares that resolve a
+            single check (capturing or blocking) and a dict mapping pinned
+            squares to the squares they can still move to
+    """
+    king_rank, king_file = king
+    checkers = []
+    evasions = set()
+    pins = {}
+
+    # knight checks can't be blocked
+    for move_rank, move_file in KNIGHT_MOVES:
+        rank, file = king_rank + move_rank, king_file + move_file
+        if 0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE:
+            if board[rank][file] == -player * KNIGHT_ID:
+                checkers.append((rank, file))
+                evasions.add((rank, file))
+
+    for direction in KING_MOVES:
+        move_rank, move_file = direction
+        rank, file = king_rank, king_file
+        # squares between the king and the current square
+        line = []
+        pinned = None
+        while True:
+            rank += move_rank
+            file += move_file
+            if not (0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE):
+                break
+            piece = board[rank][file] * player
+            if piece == EMPTY_SQUARE_ID:
+                line.append((rank, file))
+                continue
+            if piece > 0:
+                # a second friendly piece shields the first
+                if pinned:
+                    break
+                pinned = (rank, file)
+                continue
+
+            # enemy piece, pieces of either side move in mirrored directions
+            piece = -piece
+            slides = direction in PIECE_SLIDES.get(piece, ())
+            steps = not line and not pinned and direction in PIECE_STEPS[piece]
+            if pinned and slides:
+                pins[pinned] = set(line)
+                pins[pinned].add((rank, file))
+            elif not pinned and (slides or steps):
+                checkers.append((rank, file))
+                evasions.update(line)
+                evasions.add((rank, file))
+            break
+    return checkers, evasions, pins
+
+
+def attackers_to_square(board: NDArray, player: int, square: tuple) -> list:
+    """
+    Walks outwards from square to find the enemy pieces attacking it: the
+    sliders along the 8 rays, the steppers next to it and the knights
+
+    Args:
+        board (NDArray): 2D representation of board, or its rows as lists
+        player (int): player whose square is attacked
+        square (tuple): rank and file of the square
+
+    Returns:
+        list: squares of the attacking pieces
+    """
+    square_rank, square_file = square
+    # python lists are much faster to index square by square
+    rows = board.tolist() if isinstance(board, np.ndarray) else board
+    attackers = []
+    for move_rank, move_file in KNIGHT_MOVES:
+        rank, file = square_rank + move_rank, square_file + move_file
+        if 0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE:
+            if rows[rank][file] == -player * KNIGHT_ID:
+                attackers.append((rank, file))
+
+    for direction in KING_MOVES:
+        move_rank, move_file = direction
+        rank, file = square_rank + move_rank, square_file + move_file
+        adjacent = True
+        while 0 <= rank < BOARD_SIZE and 0 <= file < BOARD_SIZE:
+            piece = rows[rank][file] * -player
+            if piece == EMPTY_SQUARE_ID:
+                adjacent = False
+                rank += move_rank
+                file += move_file
+                continue
+            if piece > 0:
+                # pieces of either side move in mirrored directions
+                slides = direction in PIECE_SLIDES.get(piece, ())
+                steps = adjacent and direction in PIECE_STEPS[piece]
+                if slides or steps:
+                    attackers.append((rank, file))
+            break
+    return attackers
+
+
+def in_check(board: NDArray, player: int) -> bool:
+    """
+    Checks if player's king is attacked, looking outwards from the king
+
+    Args:
+        board (NDArray): 2D representation of board
+        player (int): player that could be in check
+
+    Returns:
+        bool: whether player is in check or not
+    """
+    kings = np.flatnonzero(board == player * KING_ID)
+    if len(kings) == 0:
+        return False
+    king = divmod(int(kings[0]), BOARD_SIZE)
+    return len(attackers_to_square(board, player, king)) > 0
+
+
+def is_legal_move(
+    board: NDArray,
+    player: int,
+    move: Move,
+    king: tuple,
+    checkers: list,
+    evasions: set,
+    pins: dict,
+) -> bool:
+    """
+    Checks that a move doesn't leave player's king in check, using the
+    results of find_checks_and_pins
+
+    Args:
+        board (NDArray): 2D representation of board
+        player (int): current player
+        move (Move): candidate move
+        king (tuple): rank and file of player's king
+        checkers (list): squares of the checking pieces
+        evasions (set): squares that resolve a single check
+        pins (dict): pinned squares mapped to their allowed destinations
+
+    Returns:
+        bool: whether the move is legal
+    """
+    if move.piece == king:
+        # king moves need a recheck of the destination square
+        new_board = move_to_board(board, player, move)
+        return not attackers_to_square(new_board, player, move.dest)
+
+    # only the king can escape a double check
+    if len(checkers) > 1:
+        return False
+    if checkers and move.dest not in evasions:
+        return False
+    allowed = pins.get(move.piece)
+    return allowed is None or move.dest in allowed
 
 
 def force_promote(piece: int, rank: int) -> bool:
@@ -172,7 +428,7 @@ def iterate_direction(
     """
     moves = []
     # piece to be moved
-    piece = board[rank][file]
+    piece = board[rank][file] * player
 
     # gets direction of move
     move_rank, move_file = move
@@ -245,7 +501,7 @@ def get_piece_moves(
     moves = []
 
     # current piece
-    piece = board[rank][file]
+    piece = board[rank][file] * player
     for move in move_set:
         new_rank, new_file = move
         new_rank += rank
@@ -327,75 +583,103 @@ def find_moves_for_piece(
     return moves
 
 
-def add_drops_piece(
-    board: NDArray, player: int, rank: int, file: int, piece: int, drops: List[Move]
-):
+def get_drops(board: NDArray, player: int, cap_pieces: dict) -> List[Move]:
     """
-    For a given piece and square, add a drop move to drops if piece can
-    be dropped at the square
+    Gets the drops of every piece in hand. The empty squares, the files
+    already holding a pawn and the rank restrictions are computed once per
+    position as masks, so each piece's drops come from one mask.
 
     Args:
-        board (NDArray): 2D representation of the board
+        board (NDArray): 2D representation of board
         player (int): current player
-        rank (int): rank of desired square
-        file (int): file of desired square
-        piece (int): dropped piece
-        drops (list[Move]): accumulator of valid drop moves
-    """
-    if piece == PAWN_ID:
-        # rank check
-        if rank == 0:
-            return
-
-        other_pawn = piece * player
-
-        # checks if there is another pawn in the file
-        if other_pawn in board[:, file]:
-            return
-
-        # creates copy of board with pawn placed
-        new_board = np.copy(board)
-        new_board[rank][file] = other_pawn
-
-        # if enemy king in check, check if checkmate
-        if board[rank - 1][file] == -player * KING_ID:
-            # don't add drop move if results in checkmate
-            if checkmate_check(rotate_board(new_board), -player):
-                return
-
-    if piece == LANCE_ID and rank == 0:
-        return
-
-    if piece == KNIGHT_ID and rank <= 1:
-        return
+        cap_pieces (dict): current player's captured pieces
 
-    # if valid drop, add to drops array
-    drops.append(Move((-1, piece), (rank, file)))
+    Returns:
+        list[Move]: valid drop moves
+    """
+    drops = []
+    empty = None
+    for piece, count in cap_pieces.items():
+        if count <= 0:
+            continue
+        if empty is None:
+            empty = board == EMPTY_SQUARE_ID
+        mask = empty.copy()
+        # pieces need a square to move to afterwards
+        mask[: DROP_FIRST_RANK.get(piece, 0)] = False
+        if piece == PAWN_ID:
+            # two unpromoted pawns can't share a file
+            mask[:, (board == player * PAWN_ID).any(axis=0)] = False
+            kings = np.flatnonzero(board == -player * KING_ID)
+            if len(kings):
+                # only a drop in front of the enemy king can be a mate
+                rank, file = divmod(int(kings[0]), BOARD_SIZE)
+                square = (rank + 1, file)
+                if rank + 1 < BOARD_SIZE and mask[square]:
+                    if pawn_drop_mates(board, player, square):
+                        mask[square] = False
+        moves = DROP_MOVES[piece]
+        drops += [moves[square] for square in np.flatnonzero(mask)]
+    return drops
 
 
-def add_drops(
-    board: NDArray, player: int, rank: int, file: int, captured_pieces: dict
-) -> List[Move]:
+def pawn_drop_mates(board: NDArray, player: int, square: tuple) -> bool:
     """
-    Gets drops that are possible on an empty tile.
+    Checks if dropping a pawn on square checkmates the opponent. A pawn
+    check can't be blocked, so the only escapes are king moves and
+    captures of the pawn by pieces that aren't pinned.
 
     Args:
-        board (NDArray): 2D representation of board
-        player (int): current player
-        rank (int): empty tile rank
-        file (int): empty tile file
-        captured_pieces (dict): pieces captured by current player
-        other_captured_pieces (dict): pieces captured by opposing player
+        board (NDArray): 2D representation of board, before the drop
+        player (int): player dropping the pawn
+        square (tuple): rank and file of the drop
 
     Returns:
-        list[Move]: valid drop moves
+        bool: whether the drop checkmates the opponent
     """
-    drops = []
-    for captured_piece, count in captured_pieces.items():
-        if count > 0:
-            add_drops_piece(board, player, rank, file, captured_piece, drops)
-
-    return drops
+    rank, file = square
+    if rank == 0 or board[rank - 1][file] != -player * KING_ID:
+        return False
+    rows = board.tolist()
+    rows[rank][file] = player * PAWN_ID
+    capturers = attackers_to_square(rows, player, square)
+
+    # the opponent's safety is checked on its own orientation
+    rotated = [row[::-1] for row in rows[::-1]]
+    last = BOARD_SIZE - 1
+    king = (last - rank + 1, last - file)
+    pawn = (last - rank, last - file)
+
+    # king escapes, including capturing the pawn
+    rotated[king[0]][king[1]] = EMPTY_SQUARE_ID
+    for move_rank, move_file in KING_MOVES:
+        dest_rank, dest_file = king[0] + move_rank, king[1] + move_file
+        if not (0 <= dest_rank < BOARD_SIZE and 0 <= dest_file < BOARD_SIZE):
+            continue
+        piece = rotated[dest_rank][dest_file]
+        if piece * player < 0:
+            continue
+        rotated[dest_rank][dest_file] = -player * KING_ID
+        escaped = not attackers_to_square(rotated, -player, (dest_rank, dest_file))
+        rotated[dest_rank][dest_file] = piece
+        if escaped:
+            return False
+    rotated[king[0]][king[1]] = -player * KING_ID
+
+    # captures of the pawn by the other pieces, unless they are pinned
+    for capturer_rank, capturer_file in capturers:
+        capturer = (last - capturer_rank, last - capturer_file)
+        if capturer == king:
+            continue
+        piece = rotated[capturer[0]][capturer[1]]
+        rotated[capturer[0]][capturer[1]] = EMPTY_SQUARE_ID
+        rotated[pawn[0]][pawn[1]] = piece
+        escaped = not attackers_to_square(rotated, -player, king)
+        rotated[capturer[0]][capturer[1]] = piece
+        rotated[pawn[0]][pawn[1]] = player * PAWN_ID
+        if escaped:
+            return False
+    return True
 
 
 def checkmate_check(board: NDArray, player: int) -> bool:
@@ -566,6 +850,22 @@ def check_check(board: NDArray, player: int) -> bool:
     For a given board, checks if player is in check. Board is oriented
     in direction of opposing player.
 
+    Args:
+        board (NDArray): 2D board representation
+        player (int): player that could be in check
+
+    Returns:
+        bool: whether player is in check or not
+    """
+    return in_check(rotate_board(board), player)
+
+
+def scan_check(board: NDArray, player: int) -> bool:
+    """
+    Reference version of check_check that asks every enemy piece whether
+    it reaches player's king. Board is oriented in direction of opposing
+    player.
+
     Args:
         board (NDArray): 2D board representation
         player (int): player that could be in check
@@ -586,10 +886,4 @@ def check_check(board: NDArray, player: int) -> bool:
 
 # METHODS ONLY USED BY FRONTEND CLIENT
 def find_drops_for_piece(board: NDArray, player: int, dropped_piece: int):
-    drops = []
-    for rank, row in enumerate(board):
-        for file, piece in enumerate(row):
-            if piece == EMPTY_SQUARE_ID:
-                add_drops_piece(board, player, rank, file, dropped_piece, drops)
-
-    return drops
+    return get_drops(board, player, {dropped_piece: 1})
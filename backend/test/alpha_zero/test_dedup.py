@@ -0,0 +1,74 @@
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append("./alpha_zero")
+from alpha_zero.dedup import PositionIndex, dedup_shards, position_hashes
+from alpha_zero.shards import ShardDataset, ShardWriter, open_shards, pack_example
+from shogi_game import ShogiGame
+
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        self.start = ShogiGame()
+        actions = np.flatnonzero(self.start.getValidMoves())
+        self.child = self.start.getNextState(actions[0])
+        self.other = self.start.getNextState(actions[1])
+
+    def test_position_hashes(self):
+        records = np.stack(
+            [pack_example(game, 0, 1) for game in [self.start, self.child, self.start]]
+        )
+        hashes = position_hashes(records)
+        self.assertEqual(hashes[0], hashes[2])
+        self.assertNotEqual(hashes[0], hashes[1])
+        # the action and value targets aren't part of the position
+        records[2]["value"] = -1
+        records[2]["actions"][0] = 5
+        self.assertEqual(position_hashes(records)[2], hashes[0])
+
+    def test_dedup_shards(self):
+        examples = [
+            (self.start, 3, 1),
+            (self.child, 8, -1),
+            (self.start, 3, -1),
+            (self.start, 4, 1),
+            (self.other, 1, 1),
+            (self.start, 3, 1),
+        ]
+        with tempfile.TemporaryDirectory() as source:
+            with tempfile.TemporaryDirectory() as directory:
+                with ShardWriter(source, shard_size=4) as writer:
+                    for example in examples:
+                        writer.add(*example)
+                self.assertEqual(len(PositionIndex(open_shards(source))), 3)
+                counts = dedup_shards(source, directory, shard_size=2, chunk=2)
+                self.assertEqual(counts, (6, 3, 0, 0.0))
+
+                dataset = ShardDataset(directory)
+                self.assertEqual(len(dataset), 3)
+                merged = {}
+                for i in range(len(dataset)):
+                    board, (actions, weights), value = dataset[i]
+                    merged[tuple(actions)] = (list(weights), value)
+        # visit count style distribution and mean value of the start position
+        self.assertEqual(merged[(3, 4)], ([0.75, 0.25], 0.5))
+        self.assertEqual(merged[(8,)], ([1], -1))
+        self.assertEqual(merged[(1,)], ([1], 1))
+
+    def test_truncated_policy(self):
+        # ten different moves, the first one played three times
+        actions = [0, 0] + list(range(10))
+        with tempfile.TemporaryDirectory() as source:
+            with ShardWriter(source) as writer:
+                for action in actions:
+                    writer.add(self.start, action, 1)
+            index = PositionIndex(open_shards(source))
+            (record,) = index.merged(0, len(index))
+        self.assertEqual(record["actions"][0], 0)
+        self.assertAlmostEqual(record["weights"][0], 3 / 10)
+        self.assertAlmostEqual(record["weights"].sum(), 1, places=6)
+        # the two lightest moves are dropped
+        self.assertEqual(index.truncated, 1)
+        self.assertAlmostEqual(index.dropped_mass, 2 / 12)
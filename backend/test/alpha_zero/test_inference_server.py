@@ -0,0 +1,56 @@
+import sys
+import threading
+import unittest
+import numpy as np
+import torch
+
+sys.path.append("./alpha_zero")
+from shogi_game import ShogiGame
+from alpha_zero.model import ResCNN
+from alpha_zero.inference_server import InferenceServer
+
+
+class TestInferenceServer(unittest.TestCase):
+    def test_batched_evaluation(self):
+        nnet = ResCNN(1)
+        nnet.eval()
+        planes = ShogiGame().toTensor().numpy()[None]
+        with torch.no_grad():
+            pi, v = nnet(torch.from_numpy(planes))
+
+        results = []
+        with InferenceServer(nnet, max_batch_size=8, max_latency=0.05) as server:
+            threads = [
+                threading.Thread(target=lambda: results.append(server(planes)))
+                for _ in range(6)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            stats = server.stats()
+
+        for result_pi, result_v in results:
+            self.assertTrue(np.allclose(result_pi, pi.numpy(), atol=1e-6))
+            self.assertTrue(np.allclose(result_v, v.numpy().reshape(-1), atol=1e-6))
+        self.assertEqual(stats["requests"], 6)
+        # requests arriving together share forward passes
+        self.assertLess(stats["batches"], 6)
+        self.assertLessEqual(stats["mean_batch_size"], 8)
+
+    def test_dead_process(self):
+        planes = ShogiGame().toTensor().numpy()[None]
+        with InferenceServer(ResCNN(1)) as server:
+            server(planes)
+            server._process.kill()
+            # requests waiting on the dead process and later ones both fail
+            with self.assertRaises(RuntimeError):
+                server(planes)
+            with self.assertRaises(RuntimeError):
+                server(planes)
+
+    def test_timeout(self):
+        # never started, so nothing answers the request
+        server = InferenceServer(ResCNN(1), timeout=0.1)
+        with self.assertRaises(TimeoutError):
+            server(ShogiGame().toTensor().numpy()[None])
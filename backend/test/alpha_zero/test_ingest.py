@@ -0,0 +1,85 @@
+import asyncio
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+sys.path.append("./alpha_zero")
+from alpha_zero.shards import ShardWriter, open_shards
+from alpha_zero.shogidb2.ingest import (
+    directory_source,
+    game_examples,
+    http_source,
+    ingest,
+    load_checkpoint,
+)
+from shogi_game import ShogiGame
+from variables import BLACK, WHITE
+
+EXAMPLE_GAME = os.path.join("alpha_zero", "shogidb2", "example_game.json")
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.games = tempfile.mkdtemp()
+        self.shards = tempfile.mkdtemp()
+        for game_id in [2, 3, 5]:
+            shutil.copy(EXAMPLE_GAME, os.path.join(self.games, f"{game_id}.json"))
+        with open(EXAMPLE_GAME, "r") as f:
+            self.examples = len(list(game_examples(json.load(f))))
+
+    def tearDown(self):
+        shutil.rmtree(self.games)
+        shutil.rmtree(self.shards)
+
+    def records(self):
+        return sum(len(shard) for shard in open_shards(self.shards))
+
+    def test_game_examples_legal(self):
+        with open(EXAMPLE_GAME, "r") as f:
+            examples = list(game_examples(json.load(f)))
+        players = {game.current_player for game, _, _ in examples}
+        self.assertEqual(players, {BLACK, WHITE})
+        # white's CSA moves have to be rotated towards white
+        for game, action, _ in examples:
+            self.assertIn(action, game.legal_actions())
+
+    def test_directory_source(self):
+        load = directory_source(self.games)
+        counts = asyncio.run(
+            ingest(range(1, 5), load, self.shards, concurrency=2, shard_size=50)
+        )
+        self.assertEqual(
+            counts, {"games": 2, "records": 2 * self.examples, "failed": 0}
+        )
+        self.assertEqual(self.records(), 2 * self.examples)
+
+        # records of an interrupted run past the checkpoint are dropped
+        with ShardWriter(self.shards) as writer:
+            writer.add(ShogiGame(), 0, 1)
+        counts = asyncio.run(ingest(range(1, 7), load, self.shards, every=1))
+        self.assertEqual(counts["games"], 1)
+        self.assertEqual(self.records(), 3 * self.examples)
+        checkpoint = load_checkpoint(self.shards)
+        self.assertEqual(checkpoint["completed"], list(range(1, 7)))
+        self.assertEqual(checkpoint["records"], 3 * self.examples)
+
+    @unittest.skipUnless(importlib.util.find_spec("requests"), "requests missing")
+    def test_http_source(self):
+        handler = partial(SimpleHTTPRequestHandler, directory=self.games)
+        server = HTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/{{}}.json"
+            load = http_source(url, concurrency=4)
+            counts = asyncio.run(ingest(range(1, 7), load, self.shards, concurrency=4))
+        finally:
+            server.shutdown()
+        self.assertEqual(counts["games"], 3)
+        self.assertEqual(self.records(), 3 * self.examples)
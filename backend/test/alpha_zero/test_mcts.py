@@ -0,0 +1,117 @@
+import sys
+import unittest
+import numpy as np
+
+sys.path.append("./alpha_zero")
+from shogi_game import ShogiGame
+from alpha_zero.model import ResCNN
+from alpha_zero.mcts_iter import MCTS
+
+
+class TestMCTS(unittest.TestCase):
+    def setUp(self):
+        self.nnet = ResCNN(1)
+
+    def check_search(self, mcts: MCTS, sims: int):
+        game = ShogiGame()
+        board = np.copy(game.board)
+        key = game.zobrist_key
+        mcts.simulate(game, sims)
+
+        # the tree is walked in place, so the game must be restored
+        self.assertTrue(np.array_equal(game.board, board))
+        self.assertEqual(game.zobrist_key, key)
+
+        # the first simulation expands the root
+        root = mcts.table.get(key)
+        self.assertEqual(root.n, sims - 1)
+        self.assertEqual(root.visits.sum(), sims - 1)
+        self.assertAlmostEqual(np.sum(mcts.getPolicy(game)), 1)
+        return root
+
+    def test_search(self):
+        self.check_search(MCTS(self.nnet), 16)
+
+    def test_batched_search(self):
+        mcts = MCTS(self.nnet, batch_size=8)
+        root = self.check_search(mcts, 33)
+        # virtual loss spreads a batch over several children
+        self.assertGreater(np.count_nonzero(root.visits), 1)
+        for key in list(mcts.table._entries):
+            node = mcts.table._entries[key]
+            self.assertFalse(node.virtual.any())
+            self.assertEqual(node.virtual_n, 0)
+
+    def test_advance(self):
+        mcts = MCTS(self.nnet, batch_size=8)
+        game = ShogiGame()
+        mcts.simulate(game, 64)
+        root_key = game.zobrist_key
+        actions, probs = mcts.getSparsePolicy(game)
+        child = game.getNextState(actions[np.argmax(probs)])
+        child_node = mcts.table.peek(child.zobrist_key)
+        visits = child_node.n
+
+        mcts.advance(child)
+        # the chosen subtree is kept and the rest of the tree is freed
+        self.assertIs(mcts.table.peek(child.zobrist_key), child_node)
+        self.assertEqual(child_node.n, visits)
+        self.assertEqual(child_node.depth, 0)
+        self.assertNotIn(root_key, mcts.table)
+        self.assertLessEqual(len(mcts.table), visits + 1)
+
+        # kept visits count towards the simulations of the next move
+        mcts.simulate(child, 32, reuse=True)
+        self.assertEqual(child_node.n, max(32, visits))
+
+    def test_tree_parallel(self):
+        mcts = MCTS(self.nnet, threads=4, parallel="tree")
+        self.addCleanup(mcts.close)
+        game = ShogiGame()
+        mcts.simulate(game, 32)
+        # threads may expand the root concurrently, wasting a simulation
+        root = mcts.table.get(game.zobrist_key)
+        self.assertGreaterEqual(root.n, 32 - 4)
+        self.assertEqual(root.visits.sum(), root.n)
+        for key in list(mcts.table._entries):
+            self.assertEqual(mcts.table._entries[key].virtual_n, 0)
+
+    def test_tree_parallel_batches(self):
+        with MCTS(self.nnet, batch_size=4, threads=2, parallel="tree") as mcts:
+            sizes = []
+            predict_batch = mcts.predict_batch
+
+            def record(inputs):
+                sizes.append(len(inputs))
+                return predict_batch(inputs)
+
+            mcts.predict_batch = record
+            game = ShogiGame()
+            mcts.simulate(game, 32)
+            root = mcts.table.get(game.zobrist_key)
+            self.assertGreaterEqual(root.n, 32 - 2)
+            # every thread evaluates its leaves in batches
+            self.assertGreater(max(sizes), 1)
+            self.assertLessEqual(max(sizes), 4)
+        # closing stops the threads, later searches run serially
+        self.assertIsNone(mcts._pool)
+        visits = root.n
+        mcts.simulate(game, 8)
+        self.assertEqual(root.n, visits + 8)
+
+    def test_root_parallel(self):
+        mcts = MCTS(self.nnet, threads=3, parallel="root")
+        self.addCleanup(mcts.close)
+        game = ShogiGame()
+        mcts.simulate(game, 30)
+        # every tree expands its own root
+        actions, probs = mcts.getSparsePolicy(game)
+        self.assertAlmostEqual(np.sum(probs), 1, places=5)
+        roots = mcts._roots(game.zobrist_key)
+        self.assertEqual(len(roots), 3)
+        self.assertEqual(sum(root.n for root in roots), 27)
+
+        child = game.getNextState(actions[np.argmax(probs)])
+        mcts.advance(child)
+        for helper in mcts._helpers:
+            self.assertNotIn(game.zobrist_key, helper.table)
@@ -0,0 +1,43 @@
+import sys
+import unittest
+import numpy as np
+import torch
+
+sys.path.append("./alpha_zero")
+from alpha_zero.alpha_zero_training import policy_loss
+from alpha_zero.policy_targets import (
+    collate_examples,
+    dense_policies,
+    densify_policy,
+    one_hot_policy,
+    sparse_policy,
+)
+from variables import ACTION_SIZE
+
+
+class TestPolicyTargets(unittest.TestCase):
+    def setUp(self):
+        board = torch.zeros(2, 3, 3)
+        self.policies = [
+            one_hot_policy(42),
+            sparse_policy([5, 700, 11000], [0.5, 0.25, 0.25]),
+        ]
+        self.batch = [(board, policy, 1) for policy in self.policies]
+
+    def test_collate(self):
+        boards, (indices, weights), vs = collate_examples(self.batch)
+        self.assertEqual(boards.size(), (2, 2, 3, 3))
+        self.assertEqual(indices.tolist(), [[42, 0, 0], [5, 700, 11000]])
+        self.assertEqual(weights.tolist(), [[1, 0, 0], [0.5, 0.25, 0.25]])
+        self.assertEqual(vs.tolist(), [1, 1])
+
+        dense = np.array([densify_policy(policy) for policy in self.policies])
+        self.assertTrue(np.allclose(dense_policies(indices, weights).numpy(), dense))
+
+    def test_sparse_loss_matches_dense(self):
+        _, target, _ = collate_examples(self.batch)
+        sample = torch.softmax(torch.randn(2, ACTION_SIZE), dim=1)
+        dense = dense_policies(*target)
+        self.assertAlmostEqual(
+            policy_loss(target, sample).item(), policy_loss(dense, sample).item(), 6
+        )
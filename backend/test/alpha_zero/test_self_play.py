@@ -0,0 +1,64 @@
+import sys
+import unittest
+import torch
+
+sys.path.append("./alpha_zero")
+from alpha_zero.self_play import ReplayBuffer, SelfPlayWorkers
+from alpha_zero.model import BOARD_PLANES, ResCNN
+from alpha_zero.policy_targets import one_hot_policy
+from variables import BOARD_SIZE
+
+
+def make_example(value):
+    board = torch.full((BOARD_PLANES, BOARD_SIZE, BOARD_SIZE), float(value))
+    return board, one_hot_policy(value), value
+
+
+class TestReplayBuffer(unittest.TestCase):
+    def test_replaces_oldest(self):
+        buffer = ReplayBuffer(4)
+        buffer.add([make_example(i) for i in range(3)])
+        buffer.add([make_example(i) for i in range(3, 6)])
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.games, 2)
+        values = sorted(example[2] for example in buffer.examples())
+        self.assertEqual(values, [2, 3, 4, 5])
+
+    def test_sample(self):
+        buffer = ReplayBuffer(10)
+        buffer.add([make_example(i) for i in range(5)])
+        boards, (indices, weights), vs = buffer.sample(8)
+        self.assertEqual(boards.size(), (8, BOARD_PLANES, BOARD_SIZE, BOARD_SIZE))
+        self.assertEqual(indices.size(), (8, 1))
+        # every board is filled with its own value
+        self.assertTrue(torch.equal(boards[:, 0, 0, 0], vs))
+        self.assertTrue(torch.equal(indices[:, 0].float(), vs))
+
+
+class TestSelfPlayWorkers(unittest.TestCase):
+    def test_worker(self):
+        nnet = ResCNN(1)
+        with SelfPlayWorkers(
+            nnet, 1, sims=2, mcts_batch_size=1, max_moves=2
+        ) as workers:
+            # bounded so a worker can't get far ahead of the trainer
+            self.assertEqual(workers._queue._maxsize, 2)
+            self.assertGreater(workers.collect(1, timeout=60), 0)
+            self.assertEqual(workers.latest_version, 0)
+            board, policy, value = workers.buffer.examples()[0]
+            self.assertEqual(board.size(), (BOARD_PLANES, BOARD_SIZE, BOARD_SIZE))
+
+            with torch.no_grad():
+                for parameter in nnet.parameters():
+                    parameter.add_(1)
+            workers.update_weights(nnet)
+            # games queued before the update were played with the old weights
+            for _ in range(4):
+                workers.collect(1, timeout=60)
+                if workers.latest_version == 1:
+                    break
+            self.assertEqual(workers.latest_version, 1)
+            for shared, parameter in zip(
+                workers._shared_nnet.parameters(), nnet.parameters()
+            ):
+                self.assertTrue(torch.equal(shared, parameter))
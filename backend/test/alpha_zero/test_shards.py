@@ -0,0 +1,131 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+sys.path.append("./alpha_zero")
+from alpha_zero.policy_targets import collate_examples, dense_policies
+from alpha_zero.shards import (
+    PackedShardDataset,
+    ShardDataset,
+    ShardStream,
+    ShardWriter,
+    collate_records,
+    convert_csvs,
+    open_shards,
+    pack_example,
+)
+from alpha_zero.training_data import load_data
+from encoding import (
+    INPUT_PLANES,
+    POSITION_DTYPE,
+    encode_packed,
+    encode_position,
+    pack_position,
+)
+from shogi_game import ShogiGame
+from move_conversion import action_to_move
+from usi import fen_to_game, move_to_usi
+from variables import WHITE
+
+
+class TestShards(unittest.TestCase):
+    def setUp(self):
+        fen = "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1"
+        self.game = fen_to_game(fen)
+        self.game.prev_state = ShogiGame()
+
+    def test_encode_packed(self):
+        game = self.game
+        positions = np.zeros(2, dtype=POSITION_DTYPE)
+        for position, player in zip(positions, [game.current_player, -1]):
+            pack_position(game.board, player, game.captured_pieces, position)
+        planes = encode_packed(positions)
+        for position_planes, player in zip(planes, [game.current_player, -1]):
+            expected = encode_position(game.board, player, game.captured_pieces)
+            self.assertTrue(np.array_equal(position_planes, expected))
+
+    def test_pack_example(self):
+        record = pack_example(self.game, 7, -1)
+        planes = encode_packed(record["positions"]).reshape(self.game.encode().shape)
+        self.assertTrue(np.array_equal(planes, self.game.encode()))
+        self.assertEqual(record["actions"][0], 7)
+        self.assertEqual(record["weights"].sum(), 1)
+        self.assertEqual(record["value"], -1)
+
+    def test_dataset(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with ShardWriter(directory, shard_size=4, buffer_size=3) as writer:
+                for action in range(10):
+                    writer.add(self.game, action, 1)
+            self.assertEqual([len(s) for s in open_shards(directory)], [4, 4, 2])
+
+            dataset = ShardDataset(directory)
+            self.assertEqual(len(dataset), 10)
+            for index in [0, 3, 4, 9, -1]:
+                board, (actions, weights), value = dataset[index]
+                self.assertEqual(actions[0], index % 10)
+                self.assertEqual(value, 1)
+            self.assertTrue(np.array_equal(board.numpy(), self.game.encode()))
+
+    def test_collate_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with ShardWriter(directory, shard_size=4) as writer:
+                for action in range(10):
+                    writer.add(self.game, action, action % 2)
+            dataset = PackedShardDataset(directory)
+            indices = [9, 0, 5, 4]
+            boards, (actions, weights), values = collate_records(
+                dataset.__getitems__(indices)
+            )
+            expected = collate_examples([ShardDataset(directory)[i] for i in indices])
+            self.assertTrue(torch.equal(boards, expected[0]))
+            self.assertTrue(
+                torch.equal(
+                    dense_policies(actions, weights), dense_policies(*expected[1])
+                )
+            )
+            self.assertTrue(torch.equal(values, expected[2]))
+
+            # every record is streamed once per epoch
+            stream = ShardStream(directory, chunk_size=3)
+            streamed = sorted(int(record["actions"][0]) for record in stream)
+            self.assertEqual(streamed, list(range(10)))
+
+    def test_load_data(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with ShardWriter(directory, shard_size=4) as writer:
+                for action in range(9):
+                    writer.add(self.game, action, 1)
+            # the csv folder is only read without shards
+            train_set, test_set, collate_fn = load_data(directory, "missing")
+            # compared by name since the test imports shards as alpha_zero.shards
+            self.assertEqual(collate_fn.__name__, "collate_records")
+            self.assertEqual(type(train_set.dataset).__name__, "PackedShardDataset")
+            self.assertEqual((len(train_set), len(test_set)), (6, 3))
+            loader = DataLoader(train_set, batch_size=4, collate_fn=collate_fn)
+            boards, (actions, weights), values = next(iter(loader))
+            self.assertEqual(tuple(boards.shape[:2]), (4, INPUT_PLANES))
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(FileNotFoundError):
+                load_data(directory, directory)
+
+    def test_convert_white_move(self):
+        prev = "lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL b - 1"
+        fen = "lnsgkgsnl/1r5b1/ppppppppp/9/9/2P6/PP1PPPPPP/1B5R1/LNSGKGSNL w - 2"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.csv")
+            with open(path, "w", newline="") as f:
+                csv.writer(f).writerow([fen, prev, "-3334FU", -1])
+            shard_dir = os.path.join(directory, "shards")
+            self.assertEqual(convert_csvs([path], shard_dir), 1)
+            (record,) = open_shards(shard_dir)[0]
+        # white's pawn push 3c3d, oriented towards white
+        move = action_to_move(int(record["actions"][0]))
+        self.assertEqual(move_to_usi(move, WHITE), "3c3d")
+        self.assertIn(record["actions"][0], fen_to_game(fen).legal_actions())
@@ -0,0 +1,65 @@
+import sys
+import unittest
+import numpy as np
+
+sys.path.append("./..")
+from alpha_zero.transposition import Node, TranspositionTable
+from variables import ACTION_SIZE
+
+
+def make_node(num_actions=10):
+    return Node(np.arange(num_actions), np.full(num_actions, 1 / num_actions))
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_sparse_priors(self):
+        policy = np.random.rand(ACTION_SIZE)
+        valids = np.zeros(ACTION_SIZE)
+        valids[[3, 50, 700]] = 1
+        node = Node.from_policy(policy, valids)
+        self.assertEqual(node.actions.tolist(), [3, 50, 700])
+        self.assertAlmostEqual(float(np.sum(node.priors)), 1, places=5)
+        self.assertEqual(np.count_nonzero(node.dense_priors()), 3)
+
+    def test_counters(self):
+        table = TranspositionTable()
+        table.store(1, make_node())
+        self.assertIsNotNone(table.get(1))
+        self.assertIsNone(table.get(2))
+        stats = table.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_lru_eviction(self):
+        node_size = make_node().size
+        table = TranspositionTable(max_memory_mb=3.5 * node_size / 2**20)
+        for key in range(3):
+            table.store(key, make_node())
+        # key 0 becomes the most recently used
+        table.get(0)
+        table.store(3, make_node())
+        self.assertEqual(len(table), 3)
+        self.assertNotIn(1, table)
+        self.assertIn(0, table)
+        self.assertEqual(table.evictions, 1)
+        self.assertLessEqual(table.memory, table.max_bytes)
+
+    def test_depth_preferred_eviction(self):
+        node_size = make_node().size
+        table = TranspositionTable(3.5 * node_size / 2**20, policy="depth")
+        table.store(0, make_node(), depth=0)
+        table.store(1, make_node(), depth=5)
+        table.store(2, make_node(), depth=1)
+        table.store(3, make_node(), depth=2)
+        self.assertNotIn(1, table)
+        self.assertEqual([key in table for key in (0, 2, 3)], [True] * 3)
+
+    def test_aging(self):
+        table = TranspositionTable(max_age=1)
+        table.store(0, make_node())
+        table.store(1, make_node())
+        table.new_generation()
+        table.get(1)
+        table.new_generation()
+        self.assertNotIn(0, table)
+        self.assertIn(1, table)
+        self.assertEqual(table.memory, make_node().size)
@@ -0,0 +1,105 @@
+import unittest
+import bitboard
+import shogi_logic
+from shogi_logic import rotate_board
+from usi import fen_to_game
+from variables import *
+import numpy as np
+
+
+class TestBitboardMoveGenerator(unittest.TestCase):
+    def setUp(self):
+        empty_rows = 7 * [BOARD_SIZE * [0]]
+        self.positions = [
+            (DEFAULT_BOARD, BLACK, {}),
+            (rotate_board(DEFAULT_BOARD), WHITE, {}),
+            (np.zeros((BOARD_SIZE, BOARD_SIZE)), BLACK, {PAWN_ID: 1}),
+            (
+                np.array([[-ROOK_ID] + 8 * [0]] + empty_rows + [[KING_ID] + 8 * [0]]),
+                BLACK,
+                {},
+            ),
+            (
+                np.array([[-PAWN_ID] + 8 * [0], [PAWN_ID] + 8 * [0]] + empty_rows),
+                BLACK,
+                {},
+            ),
+        ]
+        check2 = np.copy(DEFAULT_BOARD)
+        check2[6][4] = -ROOK_ID
+        self.positions.append((check2, BLACK, {}))
+
+        fens = [
+            "8l/1l+R2P3/p2pBG1pp/kps1p4/Nn1P2G2/P1P1P2PP/1PS6/1KSG3+r1/LN2+p3L w Sbgn3p 124",
+            "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1",
+            "R8/2K1S1SSk/4B4/9/9/9/9/9/1L1L1L3 b RBGSNLP3g3n17p 1",
+            # pawn drop on 1b would be mate
+            "8k/6S2/7GG/9/9/9/9/9/K8 b P 1",
+        ]
+        for fen in fens:
+            game = fen_to_game(fen)
+            player = game.current_player
+            self.positions.append((game.board, player, game.captured_pieces[player]))
+
+    def test_same_moves_as_array_generator(self):
+        for board, player, cap_pieces in self.positions:
+            expected = shogi_logic.get_moves(board, player, cap_pieces)
+            result = bitboard.get_moves(board, player, cap_pieces)
+            self.assertEqual(len(result), len(expected))
+            self.assertEqual(set(result), set(expected))
+
+    def test_move_counts(self):
+        counts = [len(bitboard.get_moves(*position)) for position in self.positions]
+        # 207 and 593 are the published perft(1) values of the last fens
+        self.assertEqual(counts[:3], [30, 30, 72])
+        self.assertEqual(counts[7:9], [207, 593])
+
+    def test_pawn_drop_mate(self):
+        board, player, cap_pieces = self.positions[-1]
+        drops = [
+            move.dest
+            for move in bitboard.get_moves(board, player, cap_pieces)
+            if move.piece == (-1, PAWN_ID)
+        ]
+        self.assertNotIn((1, 8), drops)
+
+        # without the silver the king can escape, so the drop is allowed
+        board = np.copy(board)
+        board[1][6] = EMPTY_SQUARE_ID
+        drops = [
+            move.dest
+            for move in bitboard.get_moves(board, player, cap_pieces)
+            if move.piece == (-1, PAWN_ID)
+        ]
+        self.assertIn((1, 8), drops)
+
+    def test_attackers_to(self):
+        board = np.copy(DEFAULT_BOARD)
+        board[6][4] = -ROOK_ID
+        position = bitboard.BitboardPosition.from_board(board, BLACK, {})
+        king = position.king_square(0)
+        self.assertTrue(position.in_check(0))
+        self.assertEqual(position.attackers_to(king, 1), bitboard.square_bit(6, 4))
+
+    def test_pawn_drop_mates_matches_array_rule(self):
+        rng = np.random.default_rng(2)
+        pieces = [piece for piece in shogi_logic.PIECE_STEPS if piece != KING_ID]
+        for _ in range(300):
+            board = np.zeros((BOARD_SIZE, BOARD_SIZE))
+            king_rank, king_file = int(rng.integers(8)), int(rng.integers(9))
+            board[king_rank][king_file] = -KING_ID
+            for _ in range(rng.integers(3, 12)):
+                rank = min(max(king_rank + rng.integers(-2, 4), 0), BOARD_SIZE - 1)
+                file = min(max(king_file + rng.integers(-2, 3), 0), BOARD_SIZE - 1)
+                if board[rank][file] == 0 and (rank, file) != (
+                    king_rank + 1,
+                    king_file,
+                ):
+                    board[rank][file] = rng.choice(pieces) * rng.choice([1, -1])
+
+            position = bitboard.BitboardPosition.from_board(board, BLACK, {})
+            square = (king_rank + 1, king_file)
+            self.assertEqual(
+                position._pawn_drop_mates(0, square[0] * BOARD_SIZE + square[1]),
+                shogi_logic.pawn_drop_mates(board, BLACK, square),
+            )
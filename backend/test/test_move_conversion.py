@@ -1,5 +1,16 @@
 from variables import ACTION_SIZE
-from move_conversion import action_to_move, move_to_action
+from move_conversion import (
+    action_to_move,
+    actions_to_moves,
+    actions_to_squares,
+    move_to_action,
+    moves_to_actions,
+    squares_to_actions,
+)
+from bitboard import BitboardPosition
+from shogi_logic import Move, get_moves
+from usi import fen_to_game
+import numpy as np
 import unittest
 
 
@@ -16,16 +27,47 @@ class TestMoveConversion(unittest.TestCase):
                 moves.add(move)
             all_moves.add((i, move))
 
-        self.assertEqual(len(moves), 10125, "Number of unique moves should be 10125")
-        self.assertEqual(repeats, 1296, "Number of repeats should be 1296")
+        self.assertEqual(
+            len(moves), ACTION_SIZE, "Every action should map to a unique move"
+        )
+        self.assertEqual(repeats, 0, "No action should map to a null move")
 
         incorrect_mappings = 0
         for action, move in all_moves:
             a = move_to_action(move)
             if a != action:
-                if move.piece != move.dest:
-                    incorrect_mappings += 1
+                incorrect_mappings += 1
 
         self.assertEqual(
             incorrect_mappings, 0, "All moves should match their action value"
         )
+
+    def test_full_board_moves(self):
+        # moves across the whole board use the last slot of a direction
+        for move in (
+            Move((0, 0), (0, 8)),
+            Move((8, 5), (0, 5), True),
+            Move((8, 8), (0, 0), True),
+        ):
+            self.assertEqual(action_to_move(int(move_to_action(move))), move)
+
+    def test_batch_conversion(self):
+        game = fen_to_game(
+            "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1"
+        )
+        player = game.current_player
+        moves = get_moves(game.board, player, game.captured_pieces[player])
+        actions = moves_to_actions(moves)
+        self.assertEqual(actions.tolist(), [move_to_action(move) for move in moves])
+        self.assertEqual(actions_to_moves(actions), moves)
+
+        # moves in the bitboard generator's square format
+        native = BitboardPosition.from_board(
+            game.board, player, game.captured_pieces[player]
+        ).legal_moves()
+        from_sq, to_sq, promote = map(np.array, zip(*native))
+        actions = squares_to_actions(from_sq, to_sq, promote)
+        self.assertEqual(sorted(actions.tolist()), sorted(moves_to_actions(moves)))
+        decoded = actions_to_squares(actions)
+        for expected, result in zip((from_sq, to_sq, promote), decoded):
+            self.assertTrue(np.array_equal(expected, result))
@@ -0,0 +1,20 @@
+import unittest
+from perft import PERFT_POSITIONS, perft, divide
+from shogi_game import MOVE_GENERATORS
+from usi import fen_to_game
+
+
+class TestPerft(unittest.TestCase):
+    def test_reference_counts(self):
+        for name, (sfen, counts) in PERFT_POSITIONS.items():
+            for engine, max_depth in (("array", 1), ("bitboard", 2)):
+                for depth, expected in enumerate(counts[:max_depth], 1):
+                    nodes = perft(fen_to_game(sfen), depth, MOVE_GENERATORS[engine])
+                    self.assertEqual(nodes, expected, f"{name} {engine} {depth}")
+
+    def test_divide(self):
+        game = fen_to_game(PERFT_POSITIONS["startpos"][0])
+        counts = divide(game, 2, MOVE_GENERATORS["array"])
+        self.assertEqual(len(counts), 30)
+        self.assertEqual(sum(counts.values()), 900)
+        self.assertEqual(counts["7g7f"], 30)
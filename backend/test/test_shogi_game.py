@@ -0,0 +1,202 @@
+import unittest
+import numpy as np
+import torch
+from encoding import encode_games, encode_position, INPUT_PLANES, POSITION_PLANES
+from shogi_game import ShogiGame, get_moves
+from shogi_logic import Move, rotate_board, rotate_move
+from move_conversion import move_to_action
+from usi import fen_to_game, game_to_fen
+from zobrist import compute_key
+from variables import *
+
+
+class TestShogiGame(unittest.TestCase):
+    def setUp(self):
+        fen = "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1"
+        self.game = fen_to_game(fen)
+
+    def test_default_state_not_shared(self):
+        game = ShogiGame()
+        game.captured_pieces[BLACK][PAWN_ID] = 1
+        game.board[0][0] = EMPTY_SQUARE_ID
+        self.assertEqual(ShogiGame().captured_pieces[BLACK][PAWN_ID], 0)
+        self.assertEqual(ShogiGame().board[0][0], -LANCE_ID)
+
+    def test_push_pop(self):
+        game = self.game
+        fen = game_to_fen(game)
+        board = np.copy(game.board)
+        player = game.current_player
+        for move in get_moves(game.board, player, game.captured_pieces[player]):
+            game.push(move)
+            self.assertEqual(game.current_player, -player)
+            # board stays oriented towards the player to move
+            self.assertTrue(
+                np.array_equal(game.board, rotate_board(game._rotated_board))
+            )
+            self.assertEqual(game.pop(), move)
+            self.assertEqual(game_to_fen(game), fen)
+            self.assertTrue(np.array_equal(game.board, board))
+
+    def test_fixed_board(self):
+        game = self.game
+        player = game.current_player
+        fixed = np.copy(game.fixed_board)
+        for move in get_moves(game.board, player, game.captured_pieces[player])[:20]:
+            next_state = game.getNextState(int(move_to_action(move)))
+            # the rotated board is copied along instead of being recomputed
+            self.assertTrue(
+                np.array_equal(
+                    next_state.board, rotate_board(next_state._rotated_board)
+                )
+            )
+            self.assertEqual(
+                game_to_fen(next_state),
+                game_to_fen(
+                    ShogiGame.from_fixed_board(
+                        next_state.captured_pieces,
+                        np.copy(next_state.fixed_board),
+                        next_state.current_player,
+                    )
+                ),
+            )
+            # white's move lands on the rotated square of the fixed board
+            rank, file = rotate_move(move).dest
+            self.assertGreater(next_state.fixed_board[rank][file] * player, 0)
+        self.assertTrue(np.array_equal(game.fixed_board, fixed))
+
+    def test_legal_move_cache(self):
+        game = self.game
+        player = game.current_player
+        moves = get_moves(game.board, player, game.captured_pieces[player])
+        actions = game.legal_actions()
+        self.assertEqual(sorted(actions), sorted(move_to_action(m) for m in moves))
+        self.assertIs(game.legal_actions(), actions)
+        valids = game.getValidMoves()
+        self.assertIs(game.getValidMoves(), valids)
+        self.assertEqual(valids.sum(), len(moves))
+        with self.assertRaises(ValueError):
+            valids[0] = 1
+
+        # push/pop clear the memoized moves, which copies then find cached
+        game.push(moves[0])
+        reply = game.legal_actions()
+        self.assertFalse(np.array_equal(reply, actions))
+        game.pop()
+        self.assertIs(game.legal_actions(), actions)
+        self.assertIs(game.getNextState(int(actions[0])).legal_actions(), reply)
+        self.assertFalse(game.getGameEnded())
+
+    def test_push_matches_next_state(self):
+        game = self.game
+        player = game.current_player
+        for move in get_moves(game.board, player, game.captured_pieces[player]):
+            next_state = game.getNextState(int(move_to_action(move)))
+            game.push(move)
+            self.assertEqual(game_to_fen(game), game_to_fen(next_state))
+            self.assertIs(next_state.prev_state, game)
+            game.pop()
+
+    def test_capture_and_drop(self):
+        game = self.game
+        # white bishop captures a lance and promotes
+        game.push(Move((3, 5), (0, 8), True))
+        self.assertEqual(game.captured_pieces[WHITE][LANCE_ID], 1)
+        self.assertEqual(game.board[8][0], -PROM_BISH_ID)
+        player = game.current_player
+        game.push(get_moves(game.board, player, game.captured_pieces[player])[0])
+        game.push(Move((-1, LANCE_ID), (4, 4)))
+        self.assertEqual(game.captured_pieces[WHITE][LANCE_ID], 0)
+        self.assertEqual(game.board[4][4], -LANCE_ID)
+        for _ in range(3):
+            game.pop()
+        self.assertEqual(game.captured_pieces[WHITE][LANCE_ID], 0)
+        self.assertEqual(game.board[3][5], -BISHOP_ID)
+        self.assertEqual(game.board[0][8], LANCE_ID)
+
+    def test_invalid_drop(self):
+        with self.assertRaises(ValueError):
+            ShogiGame().push(Move((-1, PAWN_ID), (4, 4)))
+
+    def test_zobrist_key_incremental(self):
+        game = self.game
+        root_key = game.zobrist_key
+        for move in get_moves(game.board, WHITE, game.captured_pieces[WHITE]):
+            game.push(move)
+            player = game.current_player
+            key = game.zobrist_key
+            self.assertEqual(key, compute_key(game.board, player, game.captured_pieces))
+            self.assertEqual(key, fen_to_game(game_to_fen(game)).zobrist_key)
+            for reply in get_moves(game.board, player, game.captured_pieces[player]):
+                game.push(reply)
+                self.assertEqual(
+                    game.zobrist_key,
+                    compute_key(game.board, -player, game.captured_pieces),
+                )
+                game.pop()
+            game.pop()
+        self.assertEqual(game.zobrist_key, root_key)
+
+    def test_zobrist_key_transposition(self):
+        game = ShogiGame()
+        other = ShogiGame()
+        start_key = game.zobrist_key
+        first, second = Move((6, 2), (5, 2)), Move((6, 6), (5, 6))
+        for move in (first, second, second):
+            game.push(move)
+        for move in (second, second, first):
+            other.push(move)
+        self.assertEqual(game.zobrist_key, other.zobrist_key)
+        self.assertNotEqual(game.zobrist_key, start_key)
+        # side to move is part of the key
+        game.pop()
+        self.assertNotEqual(game.zobrist_key, other.zobrist_key)
+
+    def test_to_tensor(self):
+        game = self.game
+        player = game.current_player
+        planes = game.toTensor().numpy()
+        self.assertEqual(planes.shape, (INPUT_PLANES, BOARD_SIZE, BOARD_SIZE))
+        self.assertEqual(planes.dtype, np.float32)
+
+        current = planes[POSITION_PLANES:]
+        for piece in range(KING_ID, PROM_PAWN_ID + 1):
+            own, other = current[piece - 1], current[PROM_PAWN_ID + piece - 1]
+            self.assertTrue(np.array_equal(own, game.board == player * piece))
+            self.assertTrue(np.array_equal(other, game.board == -player * piece))
+        # white holds a gold, silver, knight and five pawns, black a rook
+        # and a gold
+        hands = current[2 * PROM_PAWN_ID : -1, 0, 0].tolist()
+        self.assertEqual(hands, [1, 0, 0, 1, 0, 1, 5, 1, 1, 0, 0, 0, 0, 0])
+        self.assertFalse(current[-1].any())
+
+        # the previous position comes first
+        before = game.toTensor()[POSITION_PLANES:]
+        game.push(get_moves(game.board, player, game.captured_pieces[player])[0])
+        after = game.toTensor()
+        self.assertTrue(torch.equal(after[:POSITION_PLANES], before))
+        self.assertTrue(np.array_equal(encode_games([game])[0], after.numpy()))
+
+    def test_history_planes(self):
+        game = ShogiGame()
+        expected = [encode_position(game.board, BLACK, game.captured_pieces)]
+        for move in (Move((6, 2), (5, 2)), Move((6, 6), (5, 6))):
+            game = game.getNextState(move_to_action(move))
+            player = game.current_player
+            expected.append(encode_position(game.board, player, game.captured_pieces))
+        move = get_moves(game.board, player, game.captured_pieces[player])[0]
+        game.push(move)
+        expected.append(encode_position(game.board, -player, game.captured_pieces))
+
+        # mixes positions from the undo stack and from prev_state, and the
+        # first position repeats itself when history runs out
+        planes = game.encode(history=5).reshape(5, POSITION_PLANES, 9, 9)
+        for block, position in zip(planes, [expected[0]] + expected):
+            self.assertTrue(np.array_equal(block, position))
+        self.assertEqual(game.pop(), move)
+
+        # the child reuses the cached planes of its parent
+        key = game.zobrist_key
+        game.push(move)
+        game.toTensor()
+        self.assertIn(key, game._plane_cache)
@@ -96,3 +96,102 @@ class TestShogiLogicMethods(unittest.TestCase):
         result = get_moves(self.pawn_prom, BLACK, {})
         # print_moves(result)
         self.assertEqual(len(result), 1, "Pawn should be force promoted.")
+
+    def test_find_checks_and_pins(self):
+        board = np.zeros((BOARD_SIZE, BOARD_SIZE))
+        board[8][4] = KING_ID
+        board[6][4] = GOLD_GEN_ID
+        board[2][4] = -ROOK_ID
+        board[6][6] = -BISHOP_ID
+
+        checkers, evasions, pins = find_checks_and_pins(board, BLACK, (8, 4))
+        self.assertEqual(checkers, [(6, 6)])
+        self.assertEqual(evasions, {(7, 5), (6, 6)})
+        self.assertEqual(pins, {(6, 4): {(7, 4), (5, 4), (4, 4), (3, 4), (2, 4)}})
+
+        # pinned gold can't capture the checking bishop
+        result = get_moves(board, BLACK, {GOLD_GEN_ID: 1})
+        self.assertFalse([move for move in result if move.piece == (6, 4)])
+        # the check can be blocked with a drop
+        self.assertIn(Move((-1, GOLD_GEN_ID), (7, 5)), result)
+
+    def test_attackers_to_square(self):
+        board = np.zeros((BOARD_SIZE, BOARD_SIZE))
+        board[8][4] = KING_ID
+        board[2][4] = -LANCE_ID
+        board[6][3] = -KNIGHT_ID
+        board[7][5] = -PAWN_ID
+        board[5][1] = -PROM_BISH_ID
+        board[8][0] = -ROOK_ID
+        board[8][2] = GOLD_GEN_ID
+
+        attackers = attackers_to_square(board, BLACK, (8, 4))
+        # the pawn attacks away from the king and the rook is blocked
+        self.assertEqual(sorted(attackers), [(2, 4), (5, 1), (6, 3)])
+        self.assertTrue(in_check(board, BLACK))
+        self.assertFalse(in_check(board, WHITE))
+
+    def test_in_check_matches_scan(self):
+        rng = np.random.default_rng(0)
+        pieces = [piece for piece in PIECE_STEPS if piece != KING_ID]
+        for _ in range(300):
+            board = np.zeros((BOARD_SIZE, BOARD_SIZE))
+            squares = rng.choice(BOARD_SIZE * BOARD_SIZE, size=12, replace=False)
+            board.flat[squares[0]] = KING_ID
+            board.flat[squares[1]] = -KING_ID
+            for square in squares[2:]:
+                board.flat[square] = rng.choice(pieces) * rng.choice([1, -1])
+            for player in (BLACK, WHITE):
+                oriented = board if player == BLACK else rotate_board(board)
+                self.assertEqual(
+                    in_check(oriented, player),
+                    scan_check(rotate_board(oriented), player),
+                )
+
+    def test_pawn_drop_mates_matches_checkmate(self):
+        rng = np.random.default_rng(1)
+        pieces = [piece for piece in PIECE_STEPS if piece != KING_ID]
+        mates = 0
+        for _ in range(500):
+            board = np.zeros((BOARD_SIZE, BOARD_SIZE))
+            king_rank, king_file = int(rng.integers(8)), int(rng.integers(9))
+            board[king_rank][king_file] = -KING_ID
+            # crowds the king so that some drops mate
+            for _ in range(rng.integers(3, 12)):
+                rank = min(max(king_rank + rng.integers(-2, 4), 0), BOARD_SIZE - 1)
+                file = min(max(king_file + rng.integers(-2, 3), 0), BOARD_SIZE - 1)
+                if board[rank][file] == 0 and (rank, file) != (
+                    king_rank + 1,
+                    king_file,
+                ):
+                    board[rank][file] = rng.choice(pieces) * rng.choice([1, -1])
+
+            square = (king_rank + 1, king_file)
+            new_board = np.copy(board)
+            new_board[square] = PAWN_ID
+            mate = checkmate_check(rotate_board(new_board), WHITE)
+            self.assertEqual(pawn_drop_mates(board, BLACK, square), mate)
+            mates += mate
+        self.assertGreater(mates, 0)
+
+    def test_get_drops(self):
+        board = np.zeros((BOARD_SIZE, BOARD_SIZE))
+        board[8][4] = KING_ID
+        board[6][2] = PAWN_ID
+        board[3][7] = -PAWN_ID
+        hand = {PAWN_ID: 1, LANCE_ID: 0, KNIGHT_ID: 2, GOLD_GEN_ID: 1}
+        drops = get_drops(board, BLACK, hand)
+
+        squares = {piece: set() for piece in hand}
+        for move in drops:
+            squares[move.piece[1]].add(move.dest)
+        empty = {(rank, file) for rank, file in np.argwhere(board == 0)}
+        self.assertEqual(squares[GOLD_GEN_ID], empty)
+        self.assertEqual(squares[LANCE_ID], set())
+        # knights need two ranks ahead and pawns can't share a file
+        self.assertEqual(squares[KNIGHT_ID], {(r, f) for r, f in empty if r >= 2})
+        expected = {(r, f) for r, f in empty if r >= 1 and f != 2}
+        self.assertEqual(squares[PAWN_ID], expected)
+        self.assertEqual(
+            find_drops_for_piece(board, BLACK, PAWN_ID), drops[: len(expected)]
+        )
@@ -1,7 +1,8 @@
-from shogi_logic import rotate_board
+from shogi_logic import Move, rotate_move
 from variables import (
     BISHOP_ID,
     BLACK,
+    BOARD_SIZE,
     CAPTURED_DICT,
     KING_ID,
     KNIGHT_ID,
@@ -16,7 +17,6 @@ from variables import (
 from shogi_game import ShogiGame
 import numpy as np
 
-
 fen_mapping = {
     "P": PAWN_ID,
     "L": LANCE_ID,
@@ -96,18 +96,12 @@ def fen_to_game(fen_str: str):
 
     # choosing to omit move count from fen string
 
-    if player_to_move == WHITE:
-        board = rotate_board(board)
-
-    return ShogiGame(captured_pieces, board, player_to_move)
+    return ShogiGame.from_fixed_board(captured_pieces, board, player_to_move)
 
 
 def game_to_fen(game: ShogiGame):
-    board = game.board
-    if game.current_player == WHITE:
-        board = rotate_board(board)
     ranks = []
-    for rank in board:
+    for rank in game.fixed_board:
         runs = find_runs(rank)
         rank_str = ""
         for run in runs:
@@ -157,6 +151,30 @@ def game_to_fen(game: ShogiGame):
     return " ".join(("/".join(ranks), player, captured_pieces))
 
 
+def move_to_usi(move: Move, player: int) -> str:
+    """
+    Converts a move into USI notation (ex. 7g7f, 8h2b+, P*5e)
+
+    Args:
+        move (Move): move oriented towards player
+        player (int): player making the move
+
+    Returns:
+        str: move in USI notation
+    """
+
+    def square_to_usi(rank, file):
+        return f"{BOARD_SIZE - file}{chr(ord('a') + rank)}"
+
+    if player == WHITE:
+        move = rotate_move(move)
+    dest = square_to_usi(*move.dest)
+    if move.piece[0] == -1:
+        return f"{piece_mapping[move.piece[1]]}*{dest}"
+    promote = "+" if move.promote else ""
+    return f"{square_to_usi(*move.piece)}{dest}{promote}"
+
+
 # https://gist.github.com/alimanfoo/c5977e87111abe8127453b21204c1065
 def find_runs(x):
     """Find runs of consecutive items in an array."""
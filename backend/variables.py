@@ -93,3 +93,20 @@ CAPTURED_DICT = {
 ACTION_SIZE = 11259
 
 PROMOTE_RANK = 2
+
+# move generator used by ShogiGame, either "array" (shogi_logic) or
+# "bitboard" (bitboard)
+MOVE_GENERATOR = "array"
+
+# checkpoint of the network playing in server.py, which plays random moves
+# when there is none
+MODEL_CHECKPOINT = None
+MODEL_LAYERS = 19
+# MCTS simulations per model move in server.py
+MODEL_SIMULATIONS = 100
+# memory budget in MB of the search tree kept for every game in server.py
+MODEL_MEMORY_MB = 32
+# most positions evaluated together by the inference process, and how many
+# seconds it waits for more requests before evaluating a batch
+INFERENCE_MAX_BATCH_SIZE = 64
+INFERENCE_MAX_LATENCY = 0.005
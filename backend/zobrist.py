@@ -0,0 +1,88 @@
+import random
+from variables import BLACK, WHITE, BOARD_SIZE, PAWN_ID, PROM_PAWN_ID
+from numpy.typing import NDArray
+
+"""
+Zobrist hashing of positions. Every (square, piece), (player, hand piece,
+count) and side to move combination gets a random 64 bit number and the
+key of a position is the xor of the numbers of its features, so a move
+only needs to xor out the features it removes and xor in the ones it adds.
+
+Squares are always indexed from black's perspective, so the same position
+gets the same key whichever way the board is oriented.
+"""
+
+# most pieces of one type a hand can hold (all the pawns)
+MAX_HAND_COUNT = 18
+
+_rng = random.Random(0x5EED)
+
+
+def _random_key() -> int:
+    return _rng.getrandbits(64)
+
+
+# SQUARE_KEYS[square][piece + PROM_PAWN_ID], empty squares hash to 0
+SQUARE_KEYS = [
+    [
+        0 if piece == 0 else _random_key()
+        for piece in range(-PROM_PAWN_ID, PROM_PAWN_ID + 1)
+    ]
+    for _ in range(BOARD_SIZE * BOARD_SIZE)
+]
+
+# HAND_KEYS[player][piece][count], empty hands hash to 0
+HAND_KEYS = {
+    player: [
+        [0 if count == 0 else _random_key() for count in range(MAX_HAND_COUNT + 1)]
+        for _ in range(PAWN_ID + 1)
+    ]
+    for player in (BLACK, WHITE)
+}
+
+WHITE_TO_MOVE_KEY = _random_key()
+
+
+def square_key(rank: int, file: int, piece: int, player: int) -> int:
+    """
+    Gets the key of a piece on a square of a board oriented towards player
+
+    Args:
+        rank (int): rank from player's perspective
+        file (int): file from player's perspective
+        piece (int): signed piece id
+        player (int): player the board is oriented towards
+
+    Returns:
+        int: key of the feature
+    """
+    if player == WHITE:
+        rank, file = BOARD_SIZE - 1 - rank, BOARD_SIZE - 1 - file
+    return SQUARE_KEYS[rank * BOARD_SIZE + file][int(piece) + PROM_PAWN_ID]
+
+
+def hand_key(player: int, piece: int, count: int) -> int:
+    return HAND_KEYS[player][piece][count]
+
+
+def compute_key(board: NDArray, player: int, captured_pieces: dict) -> int:
+    """
+    Computes the key of a position from scratch
+
+    Args:
+        board (NDArray): 2D board oriented towards player
+        player (int): player to move
+        captured_pieces (dict): hands of both players
+
+    Returns:
+        int: 64 bit zobrist key
+    """
+    key = WHITE_TO_MOVE_KEY if player == WHITE else 0
+    for rank, row in enumerate(board):
+        for file, piece in enumerate(row):
+            if piece != 0:
+                key ^= square_key(rank, file, piece, player)
+    for hand_player, hand in captured_pieces.items():
+        for piece, count in hand.items():
+            key ^= hand_key(hand_player, piece, count)
+    return key